@@ -8,9 +8,10 @@ from aiogram.types import (
 
 from config.config_bot import bot, GROUP_ID, ADMINS, CHANNEL_ID
 from database import (
-    get_user_data, reset_user_mute_count, get_permanently_banned_users, update_status_to_normal, delete_user, update_user_banned_list
+    get_user_data, reset_user_mute_count, get_permanently_banned_users, update_status_to_normal, delete_user, update_user_banned_list,
+    delete_users_bulk
 )
-from show_handlers import is_user_admin
+from show_handlers import is_user_admin, load_users_page, page_navigation_buttons
 
 router = Router()
 logging.basicConfig(level=logging.INFO)
@@ -23,27 +24,9 @@ async def show_permanently_banned_users(callback_query: CallbackQuery):
     if not await is_user_admin(user_id):
         return
 
-    data_parts = callback_query.data.split(':')
-    if len(data_parts) > 1 and data_parts[1].startswith('page='):
-        page_number = int(data_parts[1].split('=')[1])
-    else:
-        page_number = 1
-
-    banned_users = await get_permanently_banned_users()
-
-    if banned_users:
-        users_per_page = 10
-        total_pages = (len(banned_users) + users_per_page - 1) // users_per_page
-
-        if page_number < 1:
-            page_number = 1
-        elif page_number > total_pages:
-            page_number = total_pages
-
-        start_index = (page_number - 1) * users_per_page
-        end_index = start_index + users_per_page
-        users_on_page = banned_users[start_index:end_index]
+    users_on_page, page_number, total_pages = await load_users_page('banned', callback_query.data)
 
+    if users_on_page:
         keyboard_buttons = []
         for user in users_on_page:
             # Получаем полное имя пользователя через API
@@ -60,16 +43,12 @@ async def show_permanently_banned_users(callback_query: CallbackQuery):
 
             button = InlineKeyboardButton(
                 text=user_text,
-                callback_data=f"select_banned_user_{user['user_id']}"
+                callback_data=f"select_banned_user_{user['user_id']}_{user['chat_id']}"
             )
             keyboard_buttons.append([button])  # Каждая кнопка в отдельной строке
 
         # Кнопки навигации
-        nav_buttons = []
-        if page_number > 1:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"show_permanently_banned_users:page={page_number - 1}"))
-        if page_number < total_pages:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"show_permanently_banned_users:page={page_number + 1}"))
+        nav_buttons = page_navigation_buttons('show_permanently_banned_users', users_on_page, page_number, total_pages)
 
         # Кнопки действий
         action_buttons = [
@@ -132,16 +111,12 @@ async def clear_all_confirm(callback_query: CallbackQuery):
         await callback_query.message.delete()
         return
 
-    success_count = 0
-    for user in banned_users:
-        user_id = user['user_id']
-        try:
-            # Удаляем пользователя из базы данных
-            await delete_user(user_id)
-            success_count += 1
-            # logger.info(f"Пользователь {user_id} удален из базы данных администратором {admin_user_id}.")
-        except Exception as e:
-            logger.error(f"Ошибка при удалении пользователя {user_id}: {e}")
+    try:
+        # Удаляем всех пользователей из базы данных одной транзакцией
+        success_count = await delete_users_bulk([(user['user_id'], user['chat_id']) for user in banned_users])
+    except Exception as e:
+        logger.error(f"Ошибка при удалении забаненных пользователей: {e}")
+        success_count = 0
 
     await callback_query.answer(f"Удалено пользователей: {success_count}.", show_alert=True)
     await callback_query.message.delete()
@@ -154,12 +129,12 @@ async def select_banned_user(callback_query: CallbackQuery):
         return
 
     try:
-        selected_user_id = int(callback_query.data.split('_')[-1])
+        selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
     except ValueError:
         await callback_query.answer("Некорректный ID пользователя.", show_alert=True)
         return
 
-    user_data = await get_user_data(selected_user_id)
+    user_data = await get_user_data(selected_user_id, selected_chat_id)
     if user_data:
         try:
             user_chat = await bot.get_chat(selected_user_id)
@@ -175,8 +150,8 @@ async def select_banned_user(callback_query: CallbackQuery):
             user_profile_link = f"ID: {selected_user_id}"
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="✅ Разбанить", callback_data=f"unban_user_{selected_user_id}")],
-            [InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"delete_banned_user_{selected_user_id}")],
+            [InlineKeyboardButton(text="✅ Разбанить", callback_data=f"unban_user_{selected_user_id}_{selected_chat_id}")],
+            [InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"delete_banned_user_{selected_user_id}_{selected_chat_id}")],
             [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_unban_user")]
         ])
 
@@ -204,15 +179,15 @@ async def delete_banned_user(callback_query: CallbackQuery):
         return
 
     try:
-        selected_user_id = int(callback_query.data.split('_')[-1])
+        selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
     except ValueError:
         await callback_query.answer("Некорректный ID пользователя.", show_alert=True)
         return
 
-    user_data = await get_user_data(selected_user_id)
+    user_data = await get_user_data(selected_user_id, selected_chat_id)
     if user_data:
         try:
-            await delete_user(selected_user_id)
+            await delete_user(selected_user_id, selected_chat_id)
             await callback_query.answer(f"Пользователь {selected_user_id} удален из базы данных.", show_alert=True)
             await callback_query.message.delete()
             # logger.info(f"Пользователь {selected_user_id} удален из базы данных администратором {admin_user_id}.")
@@ -236,8 +211,8 @@ async def unban_user(callback_query: CallbackQuery):
     if not await is_user_admin(admin_user_id):
         return
 
-    selected_user_id = int(callback_query.data.split('_')[2])
-    user_data = await get_user_data(selected_user_id)
+    selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
+    user_data = await get_user_data(selected_user_id, selected_chat_id)
 
     if user_data:
         chat_id = user_data['chat_id']
@@ -246,9 +221,9 @@ async def unban_user(callback_query: CallbackQuery):
                 chat_id=chat_id,
                 user_id=selected_user_id
             )
-            await update_status_to_normal(selected_user_id)
-            await reset_user_mute_count(selected_user_id)
-            await delete_user(selected_user_id)
+            await update_status_to_normal(selected_user_id, selected_chat_id)
+            await reset_user_mute_count(selected_user_id, selected_chat_id)
+            await delete_user(selected_user_id, selected_chat_id)
             await callback_query.answer(f"Пользователь {selected_user_id} разбанен.", show_alert=True)
             await callback_query.message.delete()
             # logger.info(f"Пользователь {selected_user_id} разбанен администратором {admin_user_id}.")
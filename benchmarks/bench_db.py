@@ -0,0 +1,111 @@
+# benchmarks/bench_db.py
+# Стоимость сохранения изменений пользователей (как при мутах во время рейда): add_or_update_user
+# только кладёт строку в буфер отложенной записи, поэтому замеряется коммит — flush_user_writes
+# после каждых --batch изменений. И задержка get_user, пока админ-панель читает большой список пользователей,
+# с настройками SQLite по умолчанию и с профилем DB_PRAGMAS из database.py
+# (только в режиме WAL чтение идёт через отдельные соединения).
+# База создаётся во временном каталоге. Нужен config/.env, как и для запуска бота.
+# Запуск из корня проекта: python -m benchmarks.bench_db [--writes 2000] [--batch 1] [--users 500] [--lookups 1000] [--scan-users 50000]
+import os
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+
+import database
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    p99_index = min(len(latencies) - 1, int(len(latencies) * 0.99))
+    return f"p50 {statistics.median(latencies) * 1e3:>7.2f} мс   p99 {latencies[p99_index] * 1e3:>7.2f} мс"
+
+
+# Большой список подозрительных пользователей, который админ-панель читает во время замера поиска
+async def fill_scan_users(users, scan_users):
+    await database.db_connection.executemany(
+        'INSERT OR IGNORE INTO users (user_id, chat_id, mute_count, last_mute_time, status) VALUES (?, ?, 0, NULL, ?)',
+        [(user_id, -100, database.USER_STATUSES['suspicious']) for user_id in range(users, users + scan_users)]
+    )
+    await database.db_connection.commit()
+
+
+# Поиск пользователей по одному, пока параллельно в цикле читается список подозрительных.
+# cached=False сбрасывает кэш пользователей перед каждым поиском, то есть замеряет чтение из базы
+async def measure_lookups(rng, lookups, users, cached):
+    if cached:
+        for user_id in range(users):
+            await database.get_user(user_id, -100)
+
+    stop = asyncio.Event()
+
+    async def scan_loop():
+        while not stop.is_set():
+            await database.get_users_with_statuses(['suspicious', 'violator'])
+
+    scanner = asyncio.create_task(scan_loop())
+    latencies = []
+    for _ in range(lookups):
+        if not cached:
+            database.invalidate_user_cache()
+        start = time.perf_counter()
+        await database.get_user(rng.randrange(users), -100)
+        latencies.append(time.perf_counter() - start)
+    stop.set()
+    await scanner
+    return latencies
+
+
+async def run(profile_name, pragmas, args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        await database.init_db(os.path.join(directory, 'bench.db'), pragmas)
+        async with database.db_connection.execute('PRAGMA journal_mode') as cursor:
+            journal_mode = (await cursor.fetchone())[0]
+
+        # Коммит каждой пачки — то, что зависит от профиля PRAGMA (fsync журнала)
+        latencies = []
+        started = time.perf_counter()
+        for index in range(1, args.writes + 1):
+            user_id = rng.randrange(args.users)
+            await database.add_or_update_user(user_id, -100, rng.randint(0, 3), datetime.now(), 'normal')
+            if index % args.batch == 0 or index == args.writes:
+                start = time.perf_counter()
+                await database.flush_user_writes()
+                latencies.append(time.perf_counter() - start)
+        total = time.perf_counter() - started
+
+        await fill_scan_users(args.users, args.scan_users)
+        db_latencies = await measure_lookups(rng, args.lookups, args.users, cached=False)
+        cached_latencies = await measure_lookups(rng, args.lookups, args.users, cached=True)
+        await database.close_db()
+
+    print(f"{profile_name:<12} journal={journal_mode:<8} {args.writes / total:>8.0f} записей/с   "
+          f"коммит пачки из {args.batch}: {percentiles(latencies)}")
+    print(f"{'':<12} get_user из базы во время выборки списка:  {percentiles(db_latencies)}")
+    print(f"{'':<12} get_user с кэшем во время выборки списка:  {percentiles(cached_latencies)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Замер записи пользователей в SQLite")
+    parser.add_argument('--writes', type=int, default=2000, help="число вызовов add_or_update_user")
+    parser.add_argument('--batch', type=int, default=1, help="сколько изменений сохраняется одним коммитом")
+    parser.add_argument('--users', type=int, default=500, help="число разных пользователей")
+    parser.add_argument('--lookups', type=int, default=1000, help="число вызовов get_user во время выборки списка")
+    parser.add_argument('--scan-users', type=int, default=50000, help="размер списка, который читается параллельно")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Каждая запись пишет в лог, для замера это лишнее
+    logging.getLogger('database').setLevel(logging.WARNING)
+
+    await run('по умолчанию', {}, args)
+    await run('DB_PRAGMAS', database.DB_PRAGMAS, args)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+# benchmarks/bench_filter.py
+# Нагрузочный замер фильтра сообщений из handle_group_message на синтетических данных:
+# нормализация, поиск по выражению, нечеткое сравнение, проверка никнеймов и весь конвейер целиком.
+# Запуск из корня проекта: python -m benchmarks.bench_filter [--sizes 10 1000 10000] [--messages 2000]
+import time
+import random
+import argparse
+import statistics
+
+from text_filter import (
+    DEFAULT_FUZZY_THRESHOLD, ForbiddenMatcher, EmojiIndex, normalize_text, check_nickname
+)
+
+RUSSIAN_LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+ENGLISH_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+EMOJIS = ['😈', '🤬', '🔥', '💦', '🍑', '👍', '❤️', '😂', '👨‍👩‍👧', '👍🏽']
+# Приёмы маскировки слов, которые встречаются в чатах
+OBFUSCATIONS = [
+    lambda word: word,
+    lambda word: '.'.join(word),
+    lambda word: ' '.join(word),
+    lambda word: word.upper(),
+    lambda word: word.replace('о', '0').replace('а', '@'),
+]
+
+
+def random_word(rng, alphabet, min_length=2, max_length=10):
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(min_length, max_length)))
+
+
+# Список запрещённых слов: в основном русские слова, немного английских и фраз
+def make_word_list(size, rng):
+    words = set()
+    while len(words) < size:
+        roll = rng.random()
+        if roll < 0.75:
+            words.add(random_word(rng, RUSSIAN_LETTERS, 4, 10))
+        elif roll < 0.9:
+            words.add(random_word(rng, ENGLISH_LETTERS, 4, 10))
+        else:
+            words.add(' '.join(random_word(rng, RUSSIAN_LETTERS, 3, 7) for _ in range(rng.randint(2, 3))))
+    return sorted(words)
+
+
+# Сообщения до 300 символов: часть содержит запрещённые слова (в том числе замаскированные)
+def make_messages(count, words, rng, dirty_share=0.1):
+    messages = []
+    for _ in range(count):
+        alphabet = RUSSIAN_LETTERS if rng.random() < 0.8 else ENGLISH_LETTERS
+        tokens = [random_word(rng, alphabet) for _ in range(rng.randint(1, 30))]
+        if rng.random() < dirty_share:
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(OBFUSCATIONS)(rng.choice(words)))
+        text = ' '.join(tokens)
+        if rng.random() < 0.2:
+            text += ' ' + rng.choice(EMOJIS)
+        messages.append(text[:300])
+    return messages
+
+
+def make_nicknames(count, nickname_words, rng):
+    nicknames = []
+    for _ in range(count):
+        name = random_word(rng, RUSSIAN_LETTERS + ENGLISH_LETTERS, 3, 12).capitalize()
+        if rng.random() < 0.05:
+            name += ' ' + rng.choice(nickname_words)
+        if rng.random() < 0.1:
+            name += rng.choice(EMOJIS)
+        nicknames.append(name)
+    return nicknames
+
+
+def measure(func, items):
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    total = time.perf_counter() - started
+    latencies.sort()
+    p99_index = min(len(latencies) - 1, int(len(latencies) * 0.99))
+    return {
+        'rate': len(items) / total if total else float('inf'),
+        'p50': statistics.median(latencies) * 1e6,
+        'p99': latencies[p99_index] * 1e6,
+    }
+
+
+def report(stage, result):
+    print(f"  {stage:<12} {result['rate']:>12.0f} сообщ/с   p50 {result['p50']:>10.1f} мкс   p99 {result['p99']:>10.1f} мкс")
+
+
+def run(size, message_count, seed):
+    rng = random.Random(seed)
+    words = make_word_list(size, rng)
+    nickname_words = make_word_list(max(1, size // 10), rng)
+    nickname_emojis = EmojiIndex(rng.sample(EMOJIS, 3))
+    messages = make_messages(message_count, words, rng)
+    nicknames = make_nicknames(message_count, nickname_words, rng)
+
+    started = time.perf_counter()
+    matcher = ForbiddenMatcher(words)
+    build_time = time.perf_counter() - started
+    print(f"Слов: {size}, сообщений: {message_count}, сборка правил: {build_time:.2f} с")
+
+    normalized = [normalize_text(text) for text in messages]
+    threshold = DEFAULT_FUZZY_THRESHOLD
+
+    report('нормализация', measure(normalize_text, messages))
+    report('выражение', measure(matcher.search, normalized))
+    report('нечеткое', measure(lambda text: matcher.fuzzy_search(text, threshold), normalized))
+    report('никнеймы', measure(lambda name: check_nickname(name, nickname_emojis, nickname_words), nicknames))
+    report('конвейер', measure(
+        lambda pair: (
+            check_nickname(pair[1], nickname_emojis, nickname_words),
+            matcher.scan(normalize_text(pair[0]), threshold),
+        ),
+        list(zip(messages, nicknames)),
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер скорости фильтра запрещённых слов")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000], help="размеры списков слов")
+    parser.add_argument('--messages', type=int, default=2000, help="число сообщений в корпусе")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.messages, args.seed)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# benchmarks/bench_normalize.py
+# Сравнение стоимости нормализации одного сообщения:
+# прежняя transliterate_to_cyrillic против normalize_text на таблицах str.translate.
+# Запуск из корня проекта: python -m benchmarks.bench_normalize
+import random
+import timeit
+
+from text_filter import normalize_text
+
+
+# Прежняя реализация из zapret_handlers, оставлена только для сравнения
+def transliterate_to_cyrillic(text):
+    translit_map = {
+        'a': 'а', 'b': 'б', 'v': 'в', 'g': 'г', 'd': 'д',
+        'e': 'е', 'z': 'з', 'i': 'и', 'k': 'к', 'l': 'л',
+        'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'r': 'р',
+        's': 'с', 't': 'т', 'u': 'у', 'f': 'ф', 'h': 'х',
+        'c': 'ц', 'y': 'у', 'w': 'ш', 'x': 'кс', 'q': 'к',
+
+    }
+    result = ''
+    for char in text:
+        result += translit_map.get(char, char)
+    return result
+
+
+def make_messages(count, length, seed=0):
+    rng = random.Random(seed)
+    alphabet = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюяabcdefghijklmnopqrstuvwxyz0123456789 .,!?@'
+    return [''.join(rng.choice(alphabet) for _ in range(length)) for _ in range(count)]
+
+
+def bench(func, messages, repeat=5):
+    number = 20
+    best = min(timeit.repeat(lambda: [func(m) for m in messages], number=number, repeat=repeat))
+    return best / (number * len(messages)) * 1e6
+
+
+def main():
+    for length in (30, 100, 300):
+        messages = make_messages(200, length)
+        old = bench(lambda m: transliterate_to_cyrillic(m.lower()), messages)
+        new = bench(normalize_text, messages)
+        print(f"{length:>4} символов: transliterate_to_cyrillic {old:7.2f} мкс, "
+              f"normalize_text {new:7.2f} мкс, ускорение x{old / new:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# benchmarks/check_fuzzy_precision.py
+# Проверка точности нечетких правил: обычные русские сообщения не должны совпадать с запрещёнными словами,
+# а опечатки и растянутые написания запрещённых слов должны находиться.
+# Все слова добавляются нечеткими правилами, сообщения проходят тот же путь, что в handle_group_message.
+# При ложном срабатывании на чистом тексте скрипт завершается с ошибкой.
+# Запуск из корня проекта: python -m benchmarks.check_fuzzy_precision [--threshold 70]
+import sys
+import argparse
+
+from text_filter import DEFAULT_FUZZY_THRESHOLD, RULE_FUZZY, ForbiddenMatcher, normalize_text
+
+FORBIDDEN_WORDS = [
+    'сука', 'сучка', 'пизда', 'пиздец', 'блядь', 'хуй', 'хуйня', 'нахуй', 'охуел', 'ебать', 'ебаный',
+    'заебал', 'мудак', 'мудила', 'пидор', 'пидорас', 'залупа', 'гандон', 'шлюха', 'долбоеб', 'уебок',
+    'говно', 'мразь', 'дебил', 'ублюдок', 'выблядок',
+]
+
+# Обычные сообщения, в том числе со словами, которые отличаются от запрещённых одной-двумя буквами
+CLEAN_MESSAGES = [
+    'у меня болит рука',
+    'забыл сумку в поезде, там была сумка с документами',
+    'поезда сегодня ходят по расписанию',
+    'привет, как дела?',
+    'доброе утро всем',
+    'кто знает, когда будет следующая встреча?',
+    'спасибо за помощь, всё заработало',
+    'скиньте, пожалуйста, ссылку на документ',
+    'на улице сегодня очень холодно',
+    'купил новую куртку, очень тёплая',
+    'сушка для белья сломалась',
+    'к чаю взяли сушки и пряники',
+    'на дереве сидит птица, а под ним сучок',
+    'сучья в костре трещали всю ночь',
+    'бляха на ремне потускнела',
+    'мудрый совет дал дедушка',
+    'мужик сказал — мужик сделал',
+    'погода стала хуже, чем вчера',
+    'ему хуже не стало',
+    'дебют группы прошёл отлично',
+    'дебет с кредитом не сходится',
+    'шлюпка отошла от берега',
+    'гондола медленно плыла по каналу',
+    'гандбол — командный вид спорта',
+    'говор у них северный, окают',
+    'пилот объявил посадку',
+    'пирог получился очень вкусным',
+    'пиджак висит в шкафу',
+    'залив замёрз в декабре',
+    'заявка принята, ждите ответа',
+    'ублажать капризного клиента надоело',
+    'выбор за вами',
+    'выпуск новостей начнётся в девять',
+    'сколько стоит доставка?',
+    'пишите в личные сообщения',
+    'завтра будет дождь',
+    'напомните, во сколько собрание',
+    'я опоздаю минут на десять',
+    'отличная идея, поддерживаю',
+    'покажите, пожалуйста, фотографии',
+    'у кого есть зарядка для ноутбука?',
+    'мама приготовила суп',
+    'сын пошёл в первый класс',
+    'на выходных поедем на дачу',
+    'в магазине закончился хлеб',
+    'объявление: продаю велосипед в хорошем состоянии',
+    'кто-нибудь видел мои ключи?',
+    'добро пожаловать в чат',
+    'соблюдайте правила группы',
+    'сегодня праздник, всех поздравляю',
+    'подскажите хорошего стоматолога',
+    'как настроить роутер?',
+    'рабочий день закончился',
+    'поставьте лайк, если согласны',
+    'у нас отключили горячую воду',
+    'сосед сверлит с утра',
+    'котёнок ищет дом, очень ласковый',
+    'собака лает на прохожих',
+    'сумерки наступают рано зимой',
+    'сухари и сушёные грибы храним в банке',
+    'суббота — день уборки',
+    'судья назначил пенальти',
+    'сумма к оплате указана в квитанции',
+    'сукно для стола привезли вчера',
+    'пицца приехала холодной',
+    'подъезд покрасили в зелёный цвет',
+    'поездка прошла спокойно',
+    'поезд задерживается на час',
+    'подъём в шесть утра',
+    'блюдо дня — борщ',
+    'бляшки на сосудах опасны',
+    'будь здоров',
+    'хурма созрела',
+    'худший фильм года',
+    'ехать далеко, возьми воду',
+    'ещё один вопрос по домашке',
+    'мудрость приходит с годами',
+    'мудрёная задача попалась',
+    'пиарщик прислал пресс-релиз',
+    'пионы расцвели в саду',
+    'гнездо ласточки под крышей',
+    'шлюз на канале открыли',
+    'долгожданный отпуск начался',
+    'уборка территории в субботу',
+    'говорите громче, плохо слышно',
+    'мрамор привезли для лестницы',
+    'дебаты затянулись до ночи',
+    'выбывший игрок вернулся в команду',
+    'поезда дальнего следования отменили',
+    'сумки и рюкзаки оставляйте в гардеробе',
+    'руки мойте перед едой',
+    'купил новый iPhone, пока доволен',
+    'оплата через PayPal или на карту',
+    'Wi-Fi в кафе не работает',
+    'посмотрите видео на YouTube',
+]
+
+# Запрещённые слова с опечатками, повторами букв и маскировкой, в том числе латинскими буквами внутри слова
+DIRTY_MESSAGES = [
+    'ну ты и сууука',
+    'с.у.к.а',
+    'какой пиздецц',
+    'полный пиздетс',
+    'долбаеб',
+    'пидарас',
+    'ублюдак',
+    'выблядак',
+    'заибал уже',
+    'мудило',
+    'залупаа',
+    'гандонн',
+    'шлююха',
+    'ебааать',
+    'п и з д а',
+    'х у й',
+    'сучкаа',
+    'мразььь',
+    'cука',
+    'CУKA',
+    'xуй',
+    'пuзда',
+    'бляdь',
+    'мудaк',
+    'гaндон',
+    'пuдор',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка ложных срабатываний нечетких правил")
+    parser.add_argument('--threshold', type=int, default=DEFAULT_FUZZY_THRESHOLD, help="порог нечеткого совпадения")
+    args = parser.parse_args()
+
+    matcher = ForbiddenMatcher(dict.fromkeys(FORBIDDEN_WORDS, RULE_FUZZY))
+
+    false_positives = []
+    for text in CLEAN_MESSAGES:
+        word = matcher.scan(normalize_text(text), args.threshold)
+        if word is not None:
+            false_positives.append((text, word))
+    misses = [text for text in DIRTY_MESSAGES if matcher.scan(normalize_text(text), args.threshold) is None]
+
+    print(f"Чистых сообщений: {len(CLEAN_MESSAGES)}, ложных срабатываний: {len(false_positives)}")
+    for text, word in false_positives:
+        print(f"  {text!r} -> {word!r}")
+    print(f"Запрещённых написаний: {len(DIRTY_MESSAGES)}, найдено: {len(DIRTY_MESSAGES) - len(misses)}")
+    for text in misses:
+        print(f"  пропущено: {text!r}")
+
+    if false_positives:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
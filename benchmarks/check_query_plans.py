@@ -0,0 +1,99 @@
+# benchmarks/check_query_plans.py
+# Проверка, что списки пользователей для админ-панели и поиск пользователя в чате
+# читаются по индексам, а не полным просмотром users.
+# Функции из database.py вызываются на временной базе, их SELECT-запросы перехватываются
+# и для каждого выполняется EXPLAIN QUERY PLAN. При полном просмотре таблицы скрипт завершается с ошибкой.
+# Нужен config/.env, как и для запуска бота.
+# Запуск из корня проекта: python -m benchmarks.check_query_plans [--users 100000]
+import os
+import sys
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+
+import database
+
+STATUSES = ['normal'] * 90 + ['suspicious'] * 4 + ['violator'] * 3 + ['banned'] * 3
+
+
+async def fill_users(count, seed):
+    rng = random.Random(seed)
+    await database.db_connection.executemany(
+        'INSERT INTO users (user_id, chat_id, mute_count, last_mute_time, status) VALUES (?, ?, ?, NULL, ?)',
+        [
+            (user_id, -100, rng.choice([0] * 9 + [1, 2, 3]), database.USER_STATUSES[rng.choice(STATUSES)])
+            for user_id in range(1, count + 1)
+        ]
+    )
+    await database.db_connection.commit()
+    await database.db_connection.execute('ANALYZE')
+
+
+# Соединение для записи и все соединения пулов для чтения
+def all_connections():
+    return [database.db_connection, *database.lookup_readers.connections, *database.list_readers.connections]
+
+
+# Вызывает функцию и возвращает выполненные ею запросы к users (с подставленными значениями параметров)
+async def captured_queries(func, *args):
+    statements = []
+    for connection in all_connections():
+        await connection.set_trace_callback(statements.append)
+    try:
+        await func(*args)
+    finally:
+        for connection in all_connections():
+            await connection.set_trace_callback(None)
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT') and 'users' in sql]
+
+
+async def query_plan(sql):
+    async with database.db_connection.execute(f'EXPLAIN QUERY PLAN {sql}') as cursor:
+        return [row[3] for row in await cursor.fetchall()]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Проверка планов запросов к таблице users")
+    parser.add_argument('--users', type=int, default=100000, help="число пользователей во временной базе")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger('database').setLevel(logging.WARNING)
+
+    checks = [
+        (database.get_suspicious_users,),
+        (database.get_violator_users,),
+        (database.get_permanently_banned_users,),
+        (database.get_users_with_statuses, ['violator', 'suspicious']),
+        (database.get_users_with_mutes_less_than_3,),
+        (database.get_users_page, 'suspicious', 10),
+        (database.get_users_page, 'violator', 10, args.users // 2),
+        (database.get_users_page, 'banned', 10, None, args.users // 2),
+        (database.count_users_with_status, 'banned'),
+        (database.get_user, args.users // 3, -100),
+    ]
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        await database.init_db(os.path.join(directory, 'plans.db'))
+        await fill_users(args.users, args.seed)
+        for func, *func_args in checks:
+            queries = await captured_queries(func, *func_args)
+            if not queries:
+                print(f"? {func.__name__}: запросы к users не найдены")
+                failures += 1
+            for sql in queries:
+                plan = await query_plan(sql)
+                uses_index = all('USING' in step and 'INDEX' in step for step in plan if 'users' in step)
+                failures += not uses_index
+                print(f"{'OK' if uses_index else 'FAIL':<4} {func.__name__}: {' | '.join(plan)}")
+        await database.close_db()
+
+    if failures:
+        print(f"Запросов без индекса: {failures}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
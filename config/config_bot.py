@@ -4,8 +4,12 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 config = dotenv_values("./config/.env")
 API_TOKEN = config['TOKEN']
-GROUP_ID = int(config['GROUP_ID'])
-CHANNEL_ID = int(config['CHANNEL_ID'])
+# Бот обслуживает несколько чатов: GROUP_ID и CHANNEL_ID можно перечислить через запятую.
+# GROUP_ID и CHANNEL_ID — первые из списков
+GROUP_IDS = [int(chat_id) for chat_id in config['GROUP_ID'].split(',')]
+CHANNEL_IDS = [int(chat_id) for chat_id in config['CHANNEL_ID'].split(',')]
+GROUP_ID = GROUP_IDS[0]
+CHANNEL_ID = CHANNEL_IDS[0]
 ADMINS = config['ADMINS']
 
 bot = Bot(token=API_TOKEN)
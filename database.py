@@ -2,179 +2,763 @@
 import logging
 import aiosqlite
 import asyncio
+import itertools
+from types import MappingProxyType
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from config.config_bot import bot
+from text_filter import ForbiddenMatcher, EmojiIndex, LRUCache, DEFAULT_RULE_TYPE, DEFAULT_FUZZY_THRESHOLD, MISSING
+from filter_pool import MODE_INLINE, MODE_PROCESS
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Создаем глобальное соединение с базой данных
 db_connection = None
+DB_PATH = 'forbidden_words.db'
+
+# Профиль соединения SQLite, применяется при запуске (PRAGMA имя = значение).
+# WAL с synchronous=NORMAL делает коммит без fsync журнала на каждую запись:
+# при сбое питания можно потерять последние транзакции, но база остаётся целой
+DB_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ (отрицательное значение), то есть 64 МиБ
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # мс
+}
+
+# Размеры пулов соединений только для чтения: для поиска пользователя на каждое сообщение
+# и для списков админ-панели, чтобы долгие выборки не задерживали проверку сообщений
+DB_LOOKUP_READERS = 2
+DB_LIST_READERS = 2
+
+# Соединения только для чтения. db_connection остаётся единственным соединением для записи,
+# а SELECT-запросы идут через пул: в режиме WAL читатели не ждут ни записи, ни друг друга,
+# и у каждого соединения aiosqlite свой поток
+class ReadPool:
+    def __init__(self, size):
+        self.size = size
+        self.connections = []
+        self._idle = None
+
+    async def open(self, db_path, pragmas):
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            connection = await aiosqlite.connect(db_path)
+            await apply_pragmas(pragmas, connection)
+            await apply_pragmas({'query_only': 1}, connection)
+            self.connections.append(connection)
+            self._idle.put_nowait(connection)
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+    # Без WAL (пул не открыт) чтение во время записи получало бы SQLITE_BUSY, поэтому читаем через db_connection
+    @asynccontextmanager
+    async def connection(self):
+        if not self.connections:
+            yield db_connection
+            return
+        connection = await self._idle.get()
+        try:
+            yield connection
+        finally:
+            self._idle.put_nowait(connection)
+
+    # Аналог db_connection.execute для использования в async with
+    @asynccontextmanager
+    async def execute(self, sql, parameters=()):
+        async with self.connection() as connection:
+            async with connection.execute(sql, parameters) as cursor:
+                yield cursor
+
+
+lookup_readers = ReadPool(DB_LOOKUP_READERS)
+list_readers = ReadPool(DB_LIST_READERS)
 
 # Асинхронные блокировки для кэшей
 cache_lock = asyncio.Lock()
+# Транзакции записи на общем соединении db_connection идут по одной: иначе коммит одного писателя
+# зафиксировал бы чужие незавершённые изменения, а откат отменил бы их
+write_lock = asyncio.Lock()
 
-# Кэши для запрещённых слов и настроек
-forbidden_words_cache = set()
-settings_cache = {}
 
-# Кэши для запрещённых эмодзи и слов в никнеймах
-forbidden_nickname_emojis_cache = set()
-forbidden_nickname_words_cache = set()
-
-# Функция для инициализации базы данных и загрузки данных
-async def init_db():
+# Транзакция записи под write_lock: коммит при выходе, откат своих изменений при ошибке или отмене
+@asynccontextmanager
+async def write_transaction():
+    async with write_lock:
+        try:
+            yield db_connection
+            await db_connection.commit()
+        except BaseException:
+            await db_connection.rollback()
+            raise
+
+# Списки и настройки с chat_id = GLOBAL_CHAT действуют во всех чатах. Слова и эмодзи отдельного чата
+# добавляются к общим, а его настройки перекрывают общие
+GLOBAL_CHAT = 0
+
+# Описание настройки: тип значения, значение по умолчанию и проверка допустимости.
+# В базе значения хранятся строками, в снимке настроек — уже разобранными (int, bool, str).
+# per_chat=False — настройка общая для процесса бота и не задаётся для отдельного чата
+class Setting:
+    def __init__(self, value_type, default, validator=None, per_chat=True):
+        self.value_type = value_type
+        self.default = default
+        self.validator = validator
+        self.per_chat = per_chat
+
+    # Приводит строку из базы или админ-панели к типу настройки, при недопустимом значении — ValueError
+    def parse(self, value):
+        if isinstance(value, str) and self.value_type is bool:
+            value = value.strip().lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(value, str) and self.value_type is not str:
+            value = self.value_type(value.strip())
+        else:
+            value = self.value_type(value)
+        if self.validator is not None and not self.validator(value):
+            raise ValueError(f"недопустимое значение {value!r}")
+        return value
+
+    def serialize(self, value):
+        if self.value_type is bool:
+            return '1' if value else '0'
+        return str(value)
+
+
+SETTINGS = {
+    'anti_spam_enabled': Setting(bool, True),
+    'filter_execution_mode': Setting(
+        str, MODE_INLINE, lambda value: value in (MODE_INLINE, MODE_PROCESS), per_chat=False
+    ),
+    'delete_message_count': Setting(int, 5, lambda value: value >= 0),
+    'fuzzy_threshold': Setting(int, DEFAULT_FUZZY_THRESHOLD, lambda value: 0 <= value <= 100),
+    'first_post_message': Setting(
+        str, "Я слежу чтобы вы не писали гадости, кто ослушается: будет наказан👇🏻👇🏻👇🏻", bool
+    ),
+    # Антиспам: не больше spam_message_limit сообщений за spam_window_seconds секунд
+    'spam_window_seconds': Setting(int, 2, lambda value: value > 0),
+    'spam_message_limit': Setting(int, 3, lambda value: value > 1),
+    # Повторный мут за спам не раньше, чем через spam_cooldown_seconds секунд после предыдущего
+    'spam_cooldown_seconds': Setting(int, 10, lambda value: value >= 0),
+    # Через сколько секунд после последнего мута счётчик мутов сбрасывается
+    'mute_reset_seconds': Setting(int, 3600, lambda value: value > 0),
+}
+
+# Снимок общих настроек только для чтения. При изменении заменяется целиком,
+# поэтому читатели не ждут блокировку, которую держат запись в базу и коммит
+settings_snapshot = MappingProxyType({key: setting.default for key, setting in SETTINGS.items()})
+
+LIST_NAMES = ('forbidden_words', 'forbidden_nickname_words', 'forbidden_nickname_emojis')
+
+# Версии списков берутся из одного счётчика для всех чатов, поэтому версия не повторяется
+# ни после изменения, ни в другом чате
+cache_version_counter = itertools.count(1)
+
+# Кэши одного чата (для GLOBAL_CHAT — общие): изменяемые списки, их снимки и версии,
+# собственные настройки чата и скомпилированные правила
+class ChatShard:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.forbidden_words = {}  # {слово: тип правила}
+        self.shadow_words = set()  # слова из forbidden_words в теневом режиме
+        self.lists = {
+            'forbidden_words': self.forbidden_words,
+            'forbidden_nickname_words': set(),
+            'forbidden_nickname_emojis': set(),
+        }
+        # Версии списков: меняются при каждом изменении соответствующего списка
+        self.versions = dict.fromkeys(LIST_NAMES, 0)
+        # Неизменяемые снимки списков: {имя_списка: (версия, frozenset)}.
+        # Публикуются одним присваиванием при каждом изменении, поэтому читаются без копирования и блокировки
+        self.snapshots = {name: (0, frozenset()) for name in LIST_NAMES}
+        # Снимки, объединённые с общими списками: {имя_списка: ((общая версия, версия чата), frozenset)}
+        self.merged_snapshots = {}
+        # Разобранные значения настроек, заданных для чата, и собранный из них снимок:
+        # (снимок общих настроек, поверх которого он собран, итоговый снимок)
+        self.settings = {}
+        self.settings_snapshot = (None, None)
+        # Скомпилированные правила, привязанные к версии списка: {имя: (версия, правила)}
+        self.compiled = {}
+
+
+# Шарды по chat_id: кэши чата находятся одним обращением к словарю, без перебора чатов
+chat_shards = {GLOBAL_CHAT: ChatShard(GLOBAL_CHAT)}
+
+# Шард чата создаётся при первой записи списка или настройки для него
+def get_chat_shard(chat_id):
+    shard = chat_shards.get(chat_id)
+    if shard is None:
+        shard = chat_shards[chat_id] = ChatShard(chat_id)
+    return shard
+
+# Скомпилированные общие правила: {имя_списка: (версия, правила)}
+compiled_rules_cache = chat_shards[GLOBAL_CHAT].compiled
+
+# Сколько новых и удалённых слов может накопиться поверх общих выражений поиска до полной пересборки
+MATCHER_MAX_DELTA = 200
+# Пауза перед фоновым уплотнением поиска, секунды: серия правок даёт одну полную пересборку
+MATCHER_COMPACTION_DELAY = 5
+matcher_compaction_task = None
+
+# Вызывается под cache_lock после изменения кэша списка
+def bump_cache_version(name, chat_id=GLOBAL_CHAT):
+    shard = chat_shards[chat_id]
+    shard.versions[name] = next(cache_version_counter)
+    shard.snapshots[name] = (shard.versions[name], frozenset(shard.lists[name]))
+
+# Версия и снимок списка, действующего в чате: общие записи вместе с записями чата.
+# Их можно хранить сколько угодно: они не меняются
+def get_list_snapshot(name, chat_id=GLOBAL_CHAT):
+    common = chat_shards[GLOBAL_CHAT].snapshots[name]
+    shard = chat_shards.get(chat_id)
+    if shard is None or chat_id == GLOBAL_CHAT or not shard.snapshots[name][1]:
+        return common
+    version = (common[0], shard.versions[name])
+    merged = shard.merged_snapshots.get(name)
+    if merged is None or merged[0] != version:
+        merged = shard.merged_snapshots[name] = (version, common[1] | shard.snapshots[name][1])
+    return merged
+
+# Записи списка, заданные именно для чата (без общих): их админ видит и правит, выбрав чат
+def _own_list_snapshot(name, chat_id):
+    shard = chat_shards.get(chat_id)
+    return shard.snapshots[name][1] if shard is not None else frozenset()
+
+# Общая версия списков для проверки никнеймов в чате: меняется при изменении слов или эмодзи
+def get_nickname_lists_version(chat_id=GLOBAL_CHAT):
+    return (
+        get_list_snapshot('forbidden_nickname_words', chat_id)[0],
+        get_list_snapshot('forbidden_nickname_emojis', chat_id)[0],
+    )
+
+# Схемы таблиц списков и настроек: записи с chat_id = GLOBAL_CHAT общие для всех чатов
+FORBIDDEN_WORDS_SCHEMA = f'''
+    chat_id INTEGER NOT NULL DEFAULT {GLOBAL_CHAT},
+    word TEXT NOT NULL,
+    rule_type TEXT NOT NULL DEFAULT '{DEFAULT_RULE_TYPE}',
+    shadow INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, word)
+'''
+FORBIDDEN_NICKNAME_WORDS_SCHEMA = f'''
+    chat_id INTEGER NOT NULL DEFAULT {GLOBAL_CHAT},
+    word TEXT NOT NULL,
+    PRIMARY KEY (chat_id, word)
+'''
+FORBIDDEN_NICKNAME_EMOJIS_SCHEMA = f'''
+    chat_id INTEGER NOT NULL DEFAULT {GLOBAL_CHAT},
+    emoji TEXT NOT NULL,
+    PRIMARY KEY (chat_id, emoji)
+'''
+SETTINGS_SCHEMA = f'''
+    chat_id INTEGER NOT NULL DEFAULT {GLOBAL_CHAT},
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (chat_id, key)
+'''
+
+# Функция для инициализации базы данных и загрузки данных.
+# pragmas заменяет профиль DB_PRAGMAS (пустой словарь — настройки SQLite по умолчанию)
+async def init_db(db_path=DB_PATH, pragmas=None):
     global db_connection
-    db_connection = await aiosqlite.connect('forbidden_words.db')
+    db_connection = await aiosqlite.connect(db_path)
+    await apply_pragmas(DB_PRAGMAS if pragmas is None else pragmas)
+
+    async with db_connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'") as cursor:
+        new_database = await cursor.fetchone() is None
 
     # Создание таблиц
-    await db_connection.execute('''
-        CREATE TABLE IF NOT EXISTS forbidden_words (
-            word TEXT PRIMARY KEY
-        )
-    ''')
+    await db_connection.execute(f'CREATE TABLE IF NOT EXISTS forbidden_words ({FORBIDDEN_WORDS_SCHEMA})')
+    # Базы, созданные до появления типов правил и теневого режима
+    await ensure_column('forbidden_words', 'rule_type', f"TEXT NOT NULL DEFAULT '{DEFAULT_RULE_TYPE}'")
+    await ensure_column('forbidden_words', 'shadow', 'INTEGER NOT NULL DEFAULT 0')
 
-    
+    # Статистика срабатываний и стоимости правил фильтра
     await db_connection.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            chat_id INTEGER NOT NULL,
-            mute_count INTEGER DEFAULT 0,
-            last_mute_time TEXT,
-            status TEXT DEFAULT 'normal'
+        CREATE TABLE IF NOT EXISTS rule_stats (
+            word TEXT PRIMARY KEY,
+            hits INTEGER NOT NULL DEFAULT 0,
+            shadow_hits INTEGER NOT NULL DEFAULT 0,
+            total_time REAL NOT NULL DEFAULT 0
         )
     ''')
-
     await db_connection.execute('''
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
+        CREATE TABLE IF NOT EXISTS filter_tier_stats (
+            tier TEXT PRIMARY KEY,
+            evaluations INTEGER NOT NULL DEFAULT 0,
+            total_time REAL NOT NULL DEFAULT 0
         )
     ''')
 
+    await db_connection.execute(f'CREATE TABLE IF NOT EXISTS users ({USERS_TABLE_SCHEMA})')
+    await db_connection.execute(f'CREATE TABLE IF NOT EXISTS settings ({SETTINGS_SCHEMA})')
+
     # Создание таблицы запрещённых эмодзи в никнеймах
-    await db_connection.execute('''
-        CREATE TABLE IF NOT EXISTS forbidden_nickname_emojis (
-            emoji TEXT PRIMARY KEY
-        )
-    ''')
+    await db_connection.execute(
+        f'CREATE TABLE IF NOT EXISTS forbidden_nickname_emojis ({FORBIDDEN_NICKNAME_EMOJIS_SCHEMA})'
+    )
 
     # Создание таблицы запрещённых слов в никнеймах
-    await db_connection.execute('''
-        CREATE TABLE IF NOT EXISTS forbidden_nickname_words (
-            word TEXT PRIMARY KEY
-        )
-    ''')
-
+    await db_connection.execute(
+        f'CREATE TABLE IF NOT EXISTS forbidden_nickname_words ({FORBIDDEN_NICKNAME_WORDS_SCHEMA})'
+    )
+
+    # Новая база сразу создаётся по последней схеме, существующая доводится до неё миграциями
+    if new_database:
+        await db_connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    else:
+        await migrate_db()
+    # Индексы для списков в админ-панели: по статусу и только по пользователям с мутами
+    await db_connection.execute('CREATE INDEX IF NOT EXISTS idx_users_status ON users (status)')
+    await db_connection.execute('CREATE INDEX IF NOT EXISTS idx_users_muted ON users (mute_count) WHERE mute_count > 0')
 
     await db_connection.commit()
 
+    # Пулы для чтения открываются после создания таблиц и только в режиме WAL
+    async with db_connection.execute('PRAGMA journal_mode') as cursor:
+        journal_mode = (await cursor.fetchone())[0]
+    if journal_mode.lower() == 'wal':
+        reader_pragmas = {
+            name: value for name, value in (DB_PRAGMAS if pragmas is None else pragmas).items()
+            if name not in ('journal_mode', 'synchronous')
+        }
+        await lookup_readers.open(db_path, reader_pragmas)
+        await list_readers.open(db_path, reader_pragmas)
+
     # Инициализируем кэши
+    invalidate_user_cache()
     await load_forbidden_words()
     await load_settings()
     await load_forbidden_nickname_emojis()
     await load_forbidden_nickname_words()
 
-    if 'anti_spam_enabled' not in settings_cache:
-        await update_setting('anti_spam_enabled', '1')
+async def apply_pragmas(pragmas, connection=None):
+    connection = connection or db_connection
+    for name, value in pragmas.items():
+        async with connection.execute(f'PRAGMA {name} = {value}') as cursor:
+            row = await cursor.fetchone()
+        # journal_mode возвращает фактический режим: WAL может быть недоступен (например, на сетевом диске)
+        if name == 'journal_mode' and row and str(row[0]).lower() != str(value).lower():
+            logger.warning(f"Не удалось включить journal_mode={value}, используется {row[0]}")
+
+async def _table_columns(table):
+    async with db_connection.execute(f'PRAGMA table_info({table})') as cursor:
+        return [row[1] for row in await cursor.fetchall()]
+
+# Добавляет колонку в существующую таблицу, если её ещё нет
+async def ensure_column(table, column, definition):
+    if column not in await _table_columns(table):
+        await db_connection.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"В таблицу {table} добавлена колонка {column}")
+
+# Версия схемы базы хранится в PRAGMA user_version, MIGRATIONS[n] переводит базу с версии n на n + 1
+async def migrate_db():
+    await db_connection.commit()
+    async with db_connection.execute('PRAGMA user_version') as cursor:
+        version = (await cursor.fetchone())[0]
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        # Миграция и новый номер версии записываются одной транзакцией
+        await db_connection.execute('BEGIN')
+        try:
+            await MIGRATIONS[target - 1]()
+            await db_connection.execute(f'PRAGMA user_version = {target}')
+            await db_connection.commit()
+        except Exception:
+            await db_connection.rollback()
+            raise
+        logger.info(f"База данных переведена на версию схемы {target}")
+
+# Тип колонки и первичный ключ в SQLite не меняются, поэтому таблица пересоздаётся с переносом строк
+# (индексы users создаются заново в init_db)
+async def _rebuild_table(table, schema, columns, select):
+    await db_connection.execute(f'CREATE TABLE {table}_new ({schema})')
+    await db_connection.execute(f'INSERT INTO {table}_new ({columns}) SELECT {select} FROM {table}')
+    await db_connection.execute(f'DROP TABLE {table}')
+    await db_connection.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+
+# Версия 1: last_mute_time из текста ISO во время Unix, status из строки в код USER_STATUSES
+async def _migrate_users_to_numeric():
+    async with db_connection.execute('SELECT user_id, chat_id, mute_count, last_mute_time, status FROM users') as cursor:
+        rows = await cursor.fetchall()
+    await db_connection.execute('''
+        CREATE TABLE users_new (
+            user_id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            mute_count INTEGER NOT NULL DEFAULT 0,
+            last_mute_time INTEGER,
+            status INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    await db_connection.executemany(
+        'INSERT INTO users_new (user_id, chat_id, mute_count, last_mute_time, status) VALUES (?, ?, ?, ?, ?)',
+        [
+            (user_id, chat_id, mute_count or 0, _encode_time(_parse_iso_time(last_mute_time)),
+             USER_STATUSES.get(status, USER_STATUSES['normal']))
+            for user_id, chat_id, mute_count, last_mute_time, status in rows
+        ]
+    )
+    await db_connection.execute('DROP TABLE users')
+    await db_connection.execute('ALTER TABLE users_new RENAME TO users')
+    logger.info(f"Пользователи переведены на числовые время мута и статус: {len(rows)}")
+
+def _parse_iso_time(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+# Версия 2: несколько чатов. Строка пользователя своя в каждом чате (уникальная пара chat_id, user_id),
+# в списках и настройках появляется chat_id, существующие записи становятся общими (GLOBAL_CHAT)
+async def _migrate_to_chat_partitions():
+    user_columns = 'chat_id, user_id, mute_count, last_mute_time, status'
+    await _rebuild_table('users', USERS_TABLE_SCHEMA, user_columns, user_columns)
+    for table, schema, columns in (
+        ('forbidden_words', FORBIDDEN_WORDS_SCHEMA, 'word, rule_type, shadow'),
+        ('forbidden_nickname_words', FORBIDDEN_NICKNAME_WORDS_SCHEMA, 'word'),
+        ('forbidden_nickname_emojis', FORBIDDEN_NICKNAME_EMOJIS_SCHEMA, 'emoji'),
+        ('settings', SETTINGS_SCHEMA, 'key, value'),
+    ):
+        # Таблица, которой не было в старой базе, уже создана по новой схеме
+        if 'chat_id' not in await _table_columns(table):
+            await _rebuild_table(table, schema, f'chat_id, {columns}', f'{GLOBAL_CHAT}, {columns}')
+    logger.info("Пользователи, списки и настройки разделены по чатам")
+
+MIGRATIONS = [
+    _migrate_users_to_numeric,
+    _migrate_to_chat_partitions,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
 
 async def close_db():
+    # Отложенные записи пользователей сохраняются до закрытия соединения
+    await flush_user_writes()
+    await lookup_readers.close()
+    await list_readers.close()
     await db_connection.close()
     logger.info("Соединение с базой данных закрыто.")
 
-# Функции для работы с запрещёнными словами
+# Функции для работы с запрещёнными словами.
+# chat_id = GLOBAL_CHAT — общий список, иначе слова, заданные только для этого чата
 
 async def load_forbidden_words():
     async with cache_lock:
-        forbidden_words_cache.clear()
-        async with db_connection.execute('SELECT word FROM forbidden_words') as cursor:
+        for shard in chat_shards.values():
+            shard.forbidden_words.clear()
+            shard.shadow_words.clear()
+        async with db_connection.execute('SELECT chat_id, word, rule_type, shadow FROM forbidden_words') as cursor:
             async for row in cursor:
-                forbidden_words_cache.add(row[0])
-    # logger.info(f"Загружены запрещённые слова: {forbidden_words_cache}")
-
-async def get_forbidden_words():
+                shard = get_chat_shard(row[0])
+                shard.forbidden_words[row[1]] = row[2]
+                if row[3]:
+                    shard.shadow_words.add(row[1])
+        chat_ids = list(chat_shards)
+        for chat_id in chat_ids:
+            bump_cache_version('forbidden_words', chat_id)
+    for chat_id in chat_ids:
+        await rebuild_forbidden_matcher(chat_id)
+
+async def get_forbidden_words(chat_id=GLOBAL_CHAT):
+    return _own_list_snapshot('forbidden_words', chat_id)
+
+# Запрещённые слова вместе с типами правил: {слово: тип}
+async def get_forbidden_rules(chat_id=GLOBAL_CHAT):
     async with cache_lock:
-        return forbidden_words_cache.copy()
+        shard = chat_shards.get(chat_id)
+        return shard.forbidden_words.copy() if shard is not None else {}
 
-async def add_forbidden_word(word):
-    word_lower = word.lower()
+# Слова в теневом режиме
+async def get_shadow_words(chat_id=GLOBAL_CHAT):
     async with cache_lock:
-        if word_lower not in forbidden_words_cache:
-            await db_connection.execute('INSERT OR IGNORE INTO forbidden_words (word) VALUES (?)', (word_lower,))
-            await db_connection.commit()
-            forbidden_words_cache.add(word_lower)
-            logger.info(f"Добавлено запрещённое слово: {word_lower}")
+        shard = chat_shards.get(chat_id)
+        return shard.shadow_words.copy() if shard is not None else set()
 
-async def remove_forbidden_word(word):
-    word_lower = word.lower()
-    async with cache_lock:
-        if word_lower in forbidden_words_cache:
-            await db_connection.execute('DELETE FROM forbidden_words WHERE word = ?', (word_lower,))
-            await db_connection.commit()
-            forbidden_words_cache.remove(word_lower)
-            logger.info(f"Удалено запрещённое слово: {word_lower}")
+async def add_forbidden_word(word, rule_type=DEFAULT_RULE_TYPE, shadow=False, chat_id=GLOBAL_CHAT):
+    await add_forbidden_rules_bulk([(word.lower(), rule_type)], shadow, chat_id)
+
+async def remove_forbidden_word(word, chat_id=GLOBAL_CHAT):
+    await remove_forbidden_words_bulk([word.lower()], chat_id)
 
-async def clear_forbidden_words():
+async def clear_forbidden_words(chat_id=GLOBAL_CHAT):
+    async with cache_lock:
+        shard = get_chat_shard(chat_id)
+        async with write_transaction():
+            await db_connection.execute('DELETE FROM forbidden_words WHERE chat_id = ?', (chat_id,))
+        shard.forbidden_words.clear()
+        shard.shadow_words.clear()
+        bump_cache_version('forbidden_words', chat_id)
+        logger.info(f"Очищен список запрещённых слов чата {chat_id}.")
+    await rebuild_forbidden_matcher(chat_id)
+
+# Версия списка и правила чата, разделённые на действующие и теневые
+async def _forbidden_rules_snapshot(chat_id):
     async with cache_lock:
-        await db_connection.execute('DELETE FROM forbidden_words')
-        await db_connection.commit()
-        forbidden_words_cache.clear()
-        logger.info("Очищен список запрещённых слов.")
+        shard = chat_shards[chat_id]
+        version = shard.versions['forbidden_words']
+        rules = {word: rule_type for word, rule_type in shard.forbidden_words.items() if word not in shard.shadow_words}
+        shadow_rules = {word: shard.forbidden_words[word] for word in shard.shadow_words}
+    return version, rules, shadow_rules
+
+# Теневых правил немного, поэтому их поиск всегда собирается целиком
+async def _rebuild_shadow_matcher(version, shadow_rules, chat_id):
+    compiled = chat_shards[chat_id].compiled
+    cached = compiled.get('forbidden_words_shadow')
+    if cached and cached[0] >= version:
+        return
+    matcher = await asyncio.to_thread(ForbiddenMatcher, shadow_rules) if shadow_rules else None
+    cached = compiled.get('forbidden_words_shadow')
+    if not cached or cached[0] < version:
+        compiled['forbidden_words_shadow'] = (version, matcher)
+
+# Полная пересборка скомпилированного поиска по запрещённым словам.
+# Выполняется один раз после изменения списка в отдельном потоке, а не при обработке сообщений.
+# Для чата без собственных слов поиск не собирается (None), проверяются только общие слова
+async def rebuild_forbidden_matcher(chat_id=GLOBAL_CHAT):
+    version, rules, shadow_rules = await _forbidden_rules_snapshot(chat_id)
+    await _rebuild_shadow_matcher(version, shadow_rules, chat_id)
+    compiled = chat_shards[chat_id].compiled
+    cached = compiled.get('forbidden_words')
+    if cached and cached[0] == version and (cached[1] is None or cached[1].is_compact):
+        return
+    if rules or chat_id == GLOBAL_CHAT:
+        matcher = await asyncio.to_thread(ForbiddenMatcher, rules)
+    else:
+        matcher = None
+    cached = compiled.get('forbidden_words')
+    # Пока шла сборка, могла успеть собраться более новая версия
+    if not cached or cached[0] < version or (cached[0] == version and cached[1] is not None and not cached[1].is_compact):
+        compiled['forbidden_words'] = (version, matcher)
+        logger.info(f"Собран поиск по запрещённым словам чата {chat_id}: {len(rules)} слов, версия {version}")
+
+# Быстрое обновление общего поиска после правки списка админом: общие выражения берутся из текущего поиска,
+# новые слова попадают в небольшое дополнительное выражение. Полная пересборка (уплотнение)
+# запускается в фоне, а при слишком большой правке выполняется сразу.
+# Списки отдельных чатов небольшие, их поиск всегда собирается целиком
+async def update_forbidden_matcher(chat_id=GLOBAL_CHAT):
+    if chat_id != GLOBAL_CHAT:
+        await rebuild_forbidden_matcher(chat_id)
+        return
+    version, rules, shadow_rules = await _forbidden_rules_snapshot(chat_id)
+    await _rebuild_shadow_matcher(version, shadow_rules, chat_id)
+    cached = compiled_rules_cache.get('forbidden_words')
+    if cached is None:
+        await rebuild_forbidden_matcher()
+        return
+    if cached[0] >= version:
+        return
+    matcher = await asyncio.to_thread(cached[1].updated, rules, MATCHER_MAX_DELTA)
+    if matcher is None:
+        await rebuild_forbidden_matcher()
+        return
+    if compiled_rules_cache['forbidden_words'][0] < version:
+        compiled_rules_cache['forbidden_words'] = (version, matcher)
+        logger.info(f"Обновлён поиск по запрещённым словам: версия {version}, правок до уплотнения {matcher.delta_size}")
+    schedule_matcher_compaction()
+
+def schedule_matcher_compaction():
+    global matcher_compaction_task
+    if matcher_compaction_task is None or matcher_compaction_task.done():
+        matcher_compaction_task = asyncio.create_task(compact_forbidden_matcher())
+
+# Фоновое уплотнение: серия правок, сделанных за MATCHER_COMPACTION_DELAY секунд, даёт одну полную пересборку
+async def compact_forbidden_matcher():
+    while True:
+        await asyncio.sleep(MATCHER_COMPACTION_DELAY)
+        try:
+            await rebuild_forbidden_matcher()
+        except Exception as e:
+            logger.error(f"Ошибка при уплотнении поиска по запрещённым словам: {e}")
+            return
+        if compiled_rules_cache['forbidden_words'][1].is_compact:
+            return
+
+# Возвращает версию и скомпилированный поиск по общим запрещённым словам (его же получает пул процессов).
+# Пока идёт пересборка, используется предыдущая собранная версия
+def get_forbidden_matcher():
+    cached = compiled_rules_cache.get('forbidden_words')
+    if cached is None:
+        shard = chat_shards[GLOBAL_CHAT]
+        rules = {word: rule_type for word, rule_type in shard.forbidden_words.items() if word not in shard.shadow_words}
+        cached = (shard.versions['forbidden_words'], ForbiddenMatcher(rules))
+        compiled_rules_cache['forbidden_words'] = cached
+    return cached
+
+# Версия и поиск по собственным словам чата, который проверяется после общего поиска.
+# (0, None), если у чата нет своих слов
+def get_chat_forbidden_matcher(chat_id):
+    shard = chat_shards.get(chat_id)
+    if shard is None or chat_id == GLOBAL_CHAT:
+        return 0, None
+    return shard.compiled.get('forbidden_words', (0, None))
+
+# Поиск по теневым правилам (общим или собственным правилам чата) или None, если их нет
+def get_shadow_matcher(chat_id=GLOBAL_CHAT):
+    shard = chat_shards.get(chat_id)
+    cached = shard.compiled.get('forbidden_words_shadow') if shard is not None else None
+    return cached[1] if cached else None
+
+# Функции для статистики правил фильтра
+
+# Прибавляет накопленные в памяти счётчики к сохранённым, одной транзакцией
+async def save_rule_stats(rules, tiers):
+    async with write_transaction():
+        await db_connection.executemany('''
+            INSERT INTO rule_stats (word, hits, shadow_hits, total_time) VALUES (?, ?, ?, ?)
+            ON CONFLICT(word) DO UPDATE SET
+                hits = hits + excluded.hits,
+                shadow_hits = shadow_hits + excluded.shadow_hits,
+                total_time = total_time + excluded.total_time
+        ''', [(word, *counters) for word, counters in rules.items()])
+        await db_connection.executemany('''
+            INSERT INTO filter_tier_stats (tier, evaluations, total_time) VALUES (?, ?, ?)
+            ON CONFLICT(tier) DO UPDATE SET
+                evaluations = evaluations + excluded.evaluations,
+                total_time = total_time + excluded.total_time
+        ''', [(tier, *counters) for tier, counters in tiers.items()])
+
+# Самые часто срабатывающие правила (order_by='hits') или самые дорогие (order_by='total_time')
+# среди слов, которые сейчас есть в списках. Статистика общая для всех чатов, поэтому слово,
+# заданное в нескольких чатах, учитывается один раз
+async def get_top_rules(order_by, limit):
+    order = 'r.hits + r.shadow_hits' if order_by == 'hits' else 'r.total_time'
+    async with list_readers.execute(f'''
+        SELECT r.word, w.rule_type, w.shadow, r.hits, r.shadow_hits, r.total_time
+        FROM rule_stats r JOIN (
+            SELECT word, MIN(rule_type) AS rule_type, MIN(shadow) AS shadow FROM forbidden_words GROUP BY word
+        ) w ON w.word = r.word
+        WHERE {order} > 0
+        ORDER BY {order} DESC
+        LIMIT ?
+    ''', (limit,)) as cursor:
+        rows = await cursor.fetchall()
+    return [
+        {'word': row[0], 'rule_type': row[1], 'shadow': bool(row[2]),
+         'hits': row[3], 'shadow_hits': row[4], 'total_time': row[5]}
+        for row in rows
+    ]
+
+async def get_filter_tier_stats():
+    async with list_readers.execute('SELECT tier, evaluations, total_time FROM filter_tier_stats') as cursor:
+        rows = await cursor.fetchall()
+    return {row[0]: {'evaluations': row[1], 'total_time': row[2]} for row in rows}
 
 # Функции для работы с настройками
 
+# Разобранное значение настройки из базы или MISSING, если оно недопустимо
+def _parse_stored_setting(chat_id, key, value):
+    setting = SETTINGS.get(key)
+    if setting is None:
+        return value
+    if chat_id != GLOBAL_CHAT and not setting.per_chat:
+        return MISSING
+    try:
+        return setting.parse(value)
+    except ValueError:
+        logger.warning(f"Некорректное значение настройки {key} = {value!r} (чат {chat_id}), используется общее")
+        return MISSING
+
 async def load_settings():
+    global settings_snapshot
+    settings = {key: setting.default for key, setting in SETTINGS.items()}
+    chat_settings = {}
     async with cache_lock:
-        settings_cache.clear()
-        async with db_connection.execute('SELECT key, value FROM settings') as cursor:
-            async for row in cursor:
-                settings_cache[row[0]] = row[1]
-    # logger.info(f"Загружены настройки: {settings_cache}")
-
-async def get_setting(key):
+        async with db_connection.execute('SELECT chat_id, key, value FROM settings') as cursor:
+            async for chat_id, key, value in cursor:
+                value = _parse_stored_setting(chat_id, key, value)
+                if value is MISSING:
+                    continue
+                if chat_id == GLOBAL_CHAT:
+                    settings[key] = value
+                else:
+                    chat_settings.setdefault(chat_id, {})[key] = value
+        for shard in chat_shards.values():
+            shard.settings = {}
+            shard.settings_snapshot = (None, None)
+        for chat_id, values in chat_settings.items():
+            get_chat_shard(chat_id).settings = values
+        settings_snapshot = MappingProxyType(settings)
+    # logger.info(f"Загружены настройки: {settings_snapshot}")
+
+# Текущий снимок настроек чата для горячего пути: один раз на сообщение, без блокировки и await.
+# Значения уже разобраны, для всех настроек из SETTINGS есть значение: заданное для чата,
+# общее или по умолчанию. Снимок чата собирается заново только после изменения его или общих настроек
+def get_settings(chat_id=GLOBAL_CHAT):
+    shard = chat_shards.get(chat_id)
+    if shard is None or not shard.settings:
+        return settings_snapshot
+    common, snapshot = shard.settings_snapshot
+    if common is not settings_snapshot:
+        common = settings_snapshot
+        snapshot = MappingProxyType({**common, **shard.settings})
+        shard.settings_snapshot = (common, snapshot)
+    return snapshot
+
+async def get_setting(key, chat_id=GLOBAL_CHAT):
+    return get_settings(chat_id).get(key)
+
+# Значение проверяется по реестру SETTINGS, при недопустимом значении — ValueError
+# (в том числе для общей настройки процесса, заданной для отдельного чата).
+# Возвращает сохранённое (разобранное) значение
+async def update_setting(key, value, chat_id=GLOBAL_CHAT):
+    global settings_snapshot
+    setting = SETTINGS.get(key)
+    if setting is not None:
+        if chat_id != GLOBAL_CHAT and not setting.per_chat:
+            raise ValueError(f"настройка {key} задаётся только для всех чатов")
+        value = setting.parse(value)
+        stored_value = setting.serialize(value)
+    else:
+        stored_value = value
     async with cache_lock:
-        return settings_cache.get(key)
-
-async def update_setting(key, value):
-    async with cache_lock:
-        settings_cache[key] = value
-        await db_connection.execute('''
-            INSERT INTO settings (key, value)
-            VALUES (?, ?)
-            ON CONFLICT(key) DO UPDATE SET value=excluded.value
-        ''', (key, value))
-        await db_connection.commit()
-    logger.info(f"Обновлено значение настройки: {key} = {value}")
-
-
+        async with write_transaction():
+            await db_connection.execute('''
+                INSERT INTO settings (chat_id, key, value)
+                VALUES (?, ?, ?)
+                ON CONFLICT(chat_id, key) DO UPDATE SET value=excluded.value
+            ''', (chat_id, key, stored_value))
+        # Новый снимок собирается из копии и подменяет старый одним присваиванием
+        if chat_id == GLOBAL_CHAT:
+            settings_snapshot = MappingProxyType({**settings_snapshot, key: value})
+        else:
+            shard = get_chat_shard(chat_id)
+            shard.settings = {**shard.settings, key: value}
+            shard.settings_snapshot = (None, None)
+    logger.info(f"Обновлено значение настройки чата {chat_id}: {key} = {value}")
+    return value
 
 async def reset_mute_counts():
-    await db_connection.execute('''
-        UPDATE users SET mute_count = 0 WHERE mute_count < 3
-    ''')
-    await db_connection.commit()
+    await flush_user_writes()
+    async with write_transaction():
+        await db_connection.execute('''
+            UPDATE users SET mute_count = 0 WHERE mute_count < 3
+        ''')
+    invalidate_user_cache()
     logger.info("Сброшены счетчики мутов для всех пользователей с мутами менее 3")
 
-async def reset_user_mute_count(user_id):
-    await db_connection.execute('UPDATE users SET mute_count = 0, last_mute_time = NULL WHERE user_id = ?', (user_id,))
-    await db_connection.commit()
+async def reset_user_mute_count(user_id, chat_id):
+    await _update_user_fields(user_id, chat_id, mute_count=0, last_mute_time=None)
     # logger.info(f"Сброшен счетчик мутов пользователя {user_id}")
 
-async def get_user_data(user_id):
-    return await get_user(user_id)
+async def get_user_data(user_id, chat_id):
+    return await get_user(user_id, chat_id)
 
 # Дополнительные функции
 
 async def get_permanently_banned_users():
+    await flush_user_writes()
     users = []
-    async with db_connection.execute('SELECT user_id, chat_id FROM users WHERE status = "banned"') as cursor:
-        async for row in cursor:
+    async with list_readers.execute('SELECT user_id, chat_id FROM users WHERE status = ?', (USER_STATUSES['banned'],)) as cursor:
+        for row in await cursor.fetchall():
             users.append({'user_id': row[0], 'chat_id': row[1]})
     return users
 
 async def get_users_with_mutes_less_than_3():
+    await flush_user_writes()
     users = []
-    async with db_connection.execute('SELECT user_id, chat_id FROM users WHERE mute_count < 3 AND mute_count > 0') as cursor:
-        async for row in cursor:
+    async with list_readers.execute('SELECT user_id, chat_id FROM users WHERE mute_count < 3 AND mute_count > 0') as cursor:
+        for row in await cursor.fetchall():
             users.append({'user_id': row[0], 'chat_id': row[1]})
     return users
 
@@ -183,193 +767,479 @@ async def get_users_with_mutes_less_than_3():
 #########################################
 #########################################
 
-# Новые функции для загрузки запрещённых эмодзи в никнеймах
-async def load_forbidden_nickname_emojis():
+# Загрузка списка (слов или эмодзи в никнеймах) всех чатов
+async def _load_list(table, column, name):
     async with cache_lock:
-        forbidden_nickname_emojis_cache.clear()
-        async with db_connection.execute('SELECT emoji FROM forbidden_nickname_emojis') as cursor:
+        for shard in chat_shards.values():
+            shard.lists[name].clear()
+        async with db_connection.execute(f'SELECT chat_id, {column} FROM {table}') as cursor:
             async for row in cursor:
-                forbidden_nickname_emojis_cache.add(row[0])
-    logger.info(f"Загружены запрещённые эмодзи в никнеймах: {forbidden_nickname_emojis_cache}")
+                get_chat_shard(row[0]).lists[name].add(row[1])
+        for chat_id in list(chat_shards):
+            bump_cache_version(name, chat_id)
+
+# Новые функции для загрузки запрещённых эмодзи в никнеймах
+async def load_forbidden_nickname_emojis():
+    await _load_list('forbidden_nickname_emojis', 'emoji', 'forbidden_nickname_emojis')
+    logger.info(f"Загружены запрещённые эмодзи в никнеймах: {get_list_snapshot('forbidden_nickname_emojis')[1]}")
+
+# Индекс запрещённых эмодзи в никнеймах, действующих в чате. Дёшево собирается
+# при первой проверке после изменения списка и хранится до следующего изменения
+def get_nickname_emoji_index(chat_id=GLOBAL_CHAT):
+    version, emojis = get_list_snapshot('forbidden_nickname_emojis', chat_id)
+    shard = chat_shards.get(chat_id, chat_shards[GLOBAL_CHAT])
+    cached = shard.compiled.get('forbidden_nickname_emojis')
+    if cached is None or cached[0] != version:
+        cached = shard.compiled['forbidden_nickname_emojis'] = (version, EmojiIndex(emojis))
+    return cached[1]
 
 # Получение списка запрещённых эмодзи в никнеймах
-async def get_forbidden_nickname_emojis():
-    async with cache_lock:
-        return forbidden_nickname_emojis_cache.copy()
+async def get_forbidden_nickname_emojis(chat_id=GLOBAL_CHAT):
+    return _own_list_snapshot('forbidden_nickname_emojis', chat_id)
 
 # Добавление запрещённого эмодзи в никнейме
-async def add_forbidden_nickname_emoji(emoji):
-    async with cache_lock:
-        if emoji not in forbidden_nickname_emojis_cache:
-            await db_connection.execute('INSERT OR IGNORE INTO forbidden_nickname_emojis (emoji) VALUES (?)', (emoji,))
-            await db_connection.commit()
-            forbidden_nickname_emojis_cache.add(emoji)
-            logger.info(f"Добавлено запрещённое эмодзи в никнейме: {emoji}")
+async def add_forbidden_nickname_emoji(emoji, chat_id=GLOBAL_CHAT):
+    await add_forbidden_nickname_emojis_bulk([emoji], chat_id)
 
 # Удаление запрещённого эмодзи в никнейме
-async def remove_forbidden_nickname_emoji(emoji):
-    async with cache_lock:
-        if emoji in forbidden_nickname_emojis_cache:
-            await db_connection.execute('DELETE FROM forbidden_nickname_emojis WHERE emoji = ?', (emoji,))
-            await db_connection.commit()
-            forbidden_nickname_emojis_cache.remove(emoji)
-            logger.info(f"Удалено запрещённое эмодзи в никнейме: {emoji}")
+async def remove_forbidden_nickname_emoji(emoji, chat_id=GLOBAL_CHAT):
+    await remove_forbidden_nickname_emojis_bulk([emoji], chat_id)
 
 # Новые функции для загрузки запрещённых слов в никнеймах
 async def load_forbidden_nickname_words():
-    async with cache_lock:
-        forbidden_nickname_words_cache.clear()
-        async with db_connection.execute('SELECT word FROM forbidden_nickname_words') as cursor:
-            async for row in cursor:
-                forbidden_nickname_words_cache.add(row[0])
-    logger.info(f"Загружены запрещённые слова в никнеймах: {forbidden_nickname_words_cache}")
+    await _load_list('forbidden_nickname_words', 'word', 'forbidden_nickname_words')
+    logger.info(f"Загружены запрещённые слова в никнеймах: {get_list_snapshot('forbidden_nickname_words')[1]}")
 
 # Получение списка запрещённых слов в никнеймах
-async def get_forbidden_nickname_words():
-    async with cache_lock:
-        return forbidden_nickname_words_cache.copy()
+async def get_forbidden_nickname_words(chat_id=GLOBAL_CHAT):
+    return _own_list_snapshot('forbidden_nickname_words', chat_id)
 
 # Добавление запрещённого слова в никнейме
-async def add_forbidden_nickname_word(word):
-    word_lower = word.lower()
-    async with cache_lock:
-        if word_lower not in forbidden_nickname_words_cache:
-            await db_connection.execute('INSERT OR IGNORE INTO forbidden_nickname_words (word) VALUES (?)', (word_lower,))
-            await db_connection.commit()
-            forbidden_nickname_words_cache.add(word_lower)
-            logger.info(f"Добавлено запрещённое слово в никнейме: {word_lower}")
+async def add_forbidden_nickname_word(word, chat_id=GLOBAL_CHAT):
+    await add_forbidden_nickname_words_bulk([word], chat_id)
 
 # Удаление запрещённого слова в никнейме
-async def remove_forbidden_nickname_word(word):
-    word_lower = word.lower()
-    async with cache_lock:
-        if word_lower in forbidden_nickname_words_cache:
-            await db_connection.execute('DELETE FROM forbidden_nickname_words WHERE word = ?', (word_lower,))
-            await db_connection.commit()
-            forbidden_nickname_words_cache.remove(word_lower)
-            logger.info(f"Удалено запрещённое слово в никнейме: {word_lower}")
+async def remove_forbidden_nickname_word(word, chat_id=GLOBAL_CHAT):
+    await remove_forbidden_nickname_words_bulk([word], chat_id)
 
-# Обновление функций get_user и add_or_update_user для учёта новых полей
-async def get_user(user_id):
-    async with db_connection.execute('SELECT user_id, chat_id, mute_count, last_mute_time, status FROM users WHERE user_id = ?', (user_id,)) as cursor:
+# Массовые операции со списками: все изменения записываются одной транзакцией с одним commit
+
+async def _add_list_entries_bulk(table, column, name, values, chat_id):
+    async with cache_lock:
+        shard = get_chat_shard(chat_id)
+        cache = shard.lists[name]
+        new_values = sorted(set(values) - cache)
+        if new_values:
+            async with write_transaction():
+                await db_connection.executemany(
+                    f'INSERT OR IGNORE INTO {table} (chat_id, {column}) VALUES (?, ?)',
+                    [(chat_id, value) for value in new_values]
+                )
+            cache.update(new_values)
+            bump_cache_version(name, chat_id)
+    return new_values
+
+async def _remove_list_entries_bulk(table, column, name, values, chat_id):
+    async with cache_lock:
+        shard = chat_shards.get(chat_id)
+        if shard is None:
+            return []
+        cache = shard.lists[name]
+        removed_values = sorted(set(values) & cache)
+        if removed_values:
+            async with write_transaction():
+                await db_connection.executemany(
+                    f'DELETE FROM {table} WHERE chat_id = ? AND {column} = ?',
+                    [(chat_id, value) for value in removed_values]
+                )
+            cache.difference_update(removed_values)
+            bump_cache_version(name, chat_id)
+    return removed_values
+
+# Возвращают списки действительно добавленных/удалённых значений
+
+# Добавление правил (слово, тип). Для уже существующего слова меняются тип правила и теневой режим
+async def add_forbidden_rules_bulk(rules, shadow=False, chat_id=GLOBAL_CHAT):
+    async with cache_lock:
+        shard = get_chat_shard(chat_id)
+        changed_rules = {
+            word: rule_type for word, rule_type in rules
+            if shard.forbidden_words.get(word) != rule_type or (word in shard.shadow_words) != shadow
+        }
+        if changed_rules:
+            async with write_transaction():
+                await db_connection.executemany('''
+                    INSERT INTO forbidden_words (chat_id, word, rule_type, shadow) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(chat_id, word) DO UPDATE SET rule_type=excluded.rule_type, shadow=excluded.shadow
+                ''', [(chat_id, word, rule_type, int(shadow)) for word, rule_type in changed_rules.items()])
+            shard.forbidden_words.update(changed_rules)
+            if shadow:
+                shard.shadow_words.update(changed_rules)
+            else:
+                shard.shadow_words.difference_update(changed_rules)
+            bump_cache_version('forbidden_words', chat_id)
+    if changed_rules:
+        logger.info(f"Добавлено запрещённых слов в чате {chat_id}: {len(changed_rules)}")
+        await update_forbidden_matcher(chat_id)
+    return sorted(changed_rules)
+
+async def add_forbidden_words_bulk(words, rule_type=DEFAULT_RULE_TYPE, shadow=False, chat_id=GLOBAL_CHAT):
+    return await add_forbidden_rules_bulk(((word.lower(), rule_type) for word in words), shadow, chat_id)
+
+# Слова удаляются в том виде, в котором хранятся в списке
+async def remove_forbidden_words_bulk(words, chat_id=GLOBAL_CHAT):
+    async with cache_lock:
+        shard = chat_shards.get(chat_id)
+        removed_words = sorted(set(words) & shard.forbidden_words.keys()) if shard is not None else []
+        if removed_words:
+            async with write_transaction():
+                await db_connection.executemany(
+                    'DELETE FROM forbidden_words WHERE chat_id = ? AND word = ?', [(chat_id, word) for word in removed_words]
+                )
+            for word in removed_words:
+                del shard.forbidden_words[word]
+            shard.shadow_words.difference_update(removed_words)
+            bump_cache_version('forbidden_words', chat_id)
+    if removed_words:
+        logger.info(f"Удалено запрещённых слов в чате {chat_id}: {len(removed_words)}")
+        await update_forbidden_matcher(chat_id)
+    return removed_words
+
+async def add_forbidden_nickname_words_bulk(words, chat_id=GLOBAL_CHAT):
+    added_words = await _add_list_entries_bulk(
+        'forbidden_nickname_words', 'word', 'forbidden_nickname_words', (word.lower() for word in words), chat_id
+    )
+    if added_words:
+        logger.info(f"Добавлено запрещённых слов в никнеймах в чате {chat_id}: {len(added_words)}")
+    return added_words
+
+async def remove_forbidden_nickname_words_bulk(words, chat_id=GLOBAL_CHAT):
+    removed_words = await _remove_list_entries_bulk(
+        'forbidden_nickname_words', 'word', 'forbidden_nickname_words', (word.lower() for word in words), chat_id
+    )
+    if removed_words:
+        logger.info(f"Удалено запрещённых слов в никнеймах в чате {chat_id}: {len(removed_words)}")
+    return removed_words
+
+async def add_forbidden_nickname_emojis_bulk(emojis, chat_id=GLOBAL_CHAT):
+    added_emojis = await _add_list_entries_bulk(
+        'forbidden_nickname_emojis', 'emoji', 'forbidden_nickname_emojis', emojis, chat_id
+    )
+    if added_emojis:
+        logger.info(f"Добавлено запрещённых эмодзи в никнеймах в чате {chat_id}: {len(added_emojis)}")
+    return added_emojis
+
+async def remove_forbidden_nickname_emojis_bulk(emojis, chat_id=GLOBAL_CHAT):
+    removed_emojis = await _remove_list_entries_bulk(
+        'forbidden_nickname_emojis', 'emoji', 'forbidden_nickname_emojis', emojis, chat_id
+    )
+    if removed_emojis:
+        logger.info(f"Удалено запрещённых эмодзи в никнеймах в чате {chat_id}: {len(removed_emojis)}")
+    return removed_emojis
+
+# Таблица пользователей: строка своя для каждой пары (chat_id, user_id), id — короткий ключ
+# для курсоров страниц админ-панели. last_mute_time — время Unix в секундах, status — код из USER_STATUSES.
+# Снаружи database.py время остаётся datetime, а статус — строкой
+USERS_TABLE_SCHEMA = '''
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    mute_count INTEGER NOT NULL DEFAULT 0,
+    last_mute_time INTEGER,
+    status INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (chat_id, user_id)
+'''
+USER_STATUSES = {'normal': 0, 'suspicious': 1, 'violator': 2, 'banned': 3}
+USER_STATUS_NAMES = {code: name for name, code in USER_STATUSES.items()}
+
+def _encode_time(value):
+    return int(value.timestamp()) if value is not None else None
+
+def _decode_time(value):
+    return datetime.fromtimestamp(value) if value is not None else None
+
+# Отложенная запись пользователей (write-behind): изменения строк копятся в памяти,
+# по одной последней версии на пользователя в чате, и записываются одной транзакцией раз в
+# USER_FLUSH_INTERVAL секунд или как только накопится USER_FLUSH_MAX_ROWS строк.
+# Во время рейда это один коммит на пачку мутов вместо коммита на каждое сообщение
+USER_FLUSH_INTERVAL = 0.2
+USER_FLUSH_MAX_ROWS = 200
+
+class UserWriteBuffer:
+    def __init__(self, interval=USER_FLUSH_INTERVAL, max_rows=USER_FLUSH_MAX_ROWS):
+        self.interval = interval
+        self.max_rows = max_rows
+        # {(user_id, chat_id): строка пользователя или None, если пользователь удалён}
+        self.pending = {}
+        # Пачки, которые сейчас записываются, от старых к новым
+        self.flushing = []
+        self._timer = None
+        # Текущая запись пачки в базу
+        self._flush_task = None
+
+    # Последняя незаписанная версия строки: dict, None (удалён) или MISSING, если изменений нет
+    def get(self, key):
+        row = self.pending.get(key, MISSING)
+        if row is MISSING:
+            for batch in reversed(self.flushing):
+                row = batch.get(key, MISSING)
+                if row is not MISSING:
+                    break
+        return row
+
+    def put(self, key, row):
+        self.pending[key] = row
+        if len(self.pending) >= self.max_rows and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._write())
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    # Записывает всё накопленное. Пачка, которая уже пишется, ещё не закоммичена:
+    # сначала дожидаемся её, чтобы после flush все изменения были видны в базе
+    async def flush(self):
+        while self._flush_task is not None and not self._flush_task.done():
+            await asyncio.wait([self._flush_task])
+        if not self.pending:
+            return
+        self._flush_task = asyncio.create_task(self._write())
+        await asyncio.wait([self._flush_task])
+
+    async def _write(self):
+        batch, self.pending = self.pending, {}
+        self.flushing.append(batch)
+        try:
+            upserts = [
+                (row['user_id'], row['chat_id'], row['mute_count'],
+                 _encode_time(row['last_mute_time']), USER_STATUSES[row['status']])
+                for row in batch.values() if row is not None
+            ]
+            deletes = [key for key, row in batch.items() if row is None]
+            # Незавершённая пачка откатывается write_transaction и не смешивается с чужими транзакциями
+            async with write_transaction():
+                if upserts:
+                    await db_connection.executemany('''
+                        INSERT INTO users (user_id, chat_id, mute_count, last_mute_time, status)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(chat_id, user_id) DO UPDATE SET
+                            mute_count=excluded.mute_count,
+                            last_mute_time=excluded.last_mute_time,
+                            status=excluded.status
+                    ''', upserts)
+                if deletes:
+                    await db_connection.executemany('DELETE FROM users WHERE user_id = ? AND chat_id = ?', deletes)
+        except BaseException as e:
+            # Пачка возвращается в буфер и при отмене задачи (CancelledError — не Exception), например при остановке бота.
+            # Более новые изменения, сделанные во время записи, важнее возвращаемых
+            self.pending = {**batch, **self.pending}
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Ошибка при записи пользователей ({len(batch)} строк), повтор при следующей записи: {e}")
+            if self._timer is None or self._timer.done():
+                self._timer = asyncio.create_task(self._flush_later())
+        finally:
+            self.flushing.remove(batch)
+
+
+user_writes = UserWriteBuffer()
+
+# Кэш строк пользователей для get_user (write-through): {(user_id, chat_id): строка или None, если записи нет}.
+# Отрицательные записи важны не меньше: большинство сообщений пишут пользователи без записи в базе.
+# Любое изменение строки сразу попадает и в кэш, и в буфер записи
+USER_CACHE_SIZE = 50000
+user_cache = LRUCache(max_size=USER_CACHE_SIZE)
+# Счётчик изменений: прочитанную из базы строку кладём в кэш, только если за время чтения ничего не менялось
+user_cache_generation = 0
+
+def _write_user(key, row):
+    global user_cache_generation
+    # Неизвестный статус не дошёл бы до базы: запись пачки падала бы при каждой попытке
+    if row is not None and row['status'] not in USER_STATUSES:
+        raise ValueError(f"неизвестный статус пользователя {row['status']!r}")
+    user_cache_generation += 1
+    user_cache.set(key, row)
+    user_writes.put(key, row)
+
+# Сброс строки из кэша после изменения в обход буфера
+def _forget_user(key):
+    global user_cache_generation
+    user_cache_generation += 1
+    user_cache.pop(key)
+
+# Сброс кэша после изменений в обход буфера (UPDATE по всей таблице, новая база)
+def invalidate_user_cache():
+    global user_cache_generation
+    user_cache_generation += 1
+    user_cache.clear()
+
+# Принудительная запись отложенных изменений: перед запросами по всей таблице и при завершении
+async def flush_user_writes():
+    await user_writes.flush()
+
+async def _select_user(user_id, chat_id):
+    async with lookup_readers.execute(
+        'SELECT user_id, chat_id, mute_count, last_mute_time, status FROM users WHERE chat_id = ? AND user_id = ?',
+        (chat_id, user_id)
+    ) as cursor:
         row = await cursor.fetchone()
         if row:
             return {
                 'user_id': row[0],
                 'chat_id': row[1],
                 'mute_count': row[2],
-                'last_mute_time': datetime.fromisoformat(row[3]) if row[3] else None,
-                'status': row[4]
-                
+                'last_mute_time': _decode_time(row[3]),
+                'status': USER_STATUS_NAMES.get(row[4], 'normal')
             }
     return None
 
+# Текущая строка пользователя (не копия) или None: из кэша, незаписанных изменений или базы
+async def _current_user(user_id, chat_id):
+    key = (user_id, chat_id)
+    row = user_cache.get(key)
+    if row is MISSING:
+        row = user_writes.get(key)
+    if row is MISSING:
+        generation = user_cache_generation
+        row = await _select_user(user_id, chat_id)
+        if generation == user_cache_generation:
+            user_cache.set(key, row)
+        else:
+            # Пока шло чтение, строку могли изменить
+            newer_row = user_cache.get(key)
+            if newer_row is MISSING:
+                newer_row = user_writes.get(key)
+            if newer_row is not MISSING:
+                row = newer_row
+    return row
+
+# Изменение отдельных полей существующего пользователя (как UPDATE ... WHERE user_id = ? AND chat_id = ?)
+async def _update_user_fields(user_id, chat_id, **fields):
+    row = await _current_user(user_id, chat_id)
+    if row is not None:
+        _write_user((user_id, chat_id), {**row, **fields})
+
+# Обновление функций get_user и add_or_update_user для учёта новых полей.
+# Сначала смотрим кэш и незаписанные изменения, поэтому только что сделанная запись видна сразу
+async def get_user(user_id, chat_id):
+    row = await _current_user(user_id, chat_id)
+    # Копия: вызывающий код меняет полученный словарь
+    return dict(row) if row is not None else None
+
 async def add_or_update_user(user_id, chat_id, mute_count, last_mute_time, status='normal'):
-    await db_connection.execute('''
-        INSERT INTO users (user_id, chat_id, mute_count, last_mute_time, status)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(user_id) DO UPDATE SET
-            chat_id=excluded.chat_id,
-            mute_count=excluded.mute_count,
-            last_mute_time=excluded.last_mute_time,
-            status=excluded.status
-    ''', (user_id, chat_id, mute_count, last_mute_time.isoformat() if last_mute_time else None, status))
-    await db_connection.commit()
-    logger.info(f"Обновлена информация о пользователе {user_id}")
+    _write_user((user_id, chat_id), {
+        'user_id': user_id,
+        'chat_id': chat_id,
+        'mute_count': mute_count,
+        'last_mute_time': last_mute_time,
+        'status': status,
+    })
+    logger.info(f"Обновлена информация о пользователе {user_id} в чате {chat_id}")
 
 # Функции для получения списка подозрительных и нарушителей
 async def get_suspicious_users():
+    await flush_user_writes()
     users = []
-    async with db_connection.execute('SELECT user_id, chat_id FROM users WHERE status = "suspicious"') as cursor:
-        async for row in cursor:
+    async with list_readers.execute('SELECT user_id, chat_id FROM users WHERE status = ?', (USER_STATUSES['suspicious'],)) as cursor:
+        for row in await cursor.fetchall():
             users.append({'user_id': row[0], 'chat_id': row[1]})
     return users
 
 async def get_violator_users():
+    await flush_user_writes()
     users = []
-    async with db_connection.execute('SELECT user_id, chat_id FROM users WHERE status = "violator"') as cursor:
-        async for row in cursor:
+    async with list_readers.execute('SELECT user_id, chat_id FROM users WHERE status = ?', (USER_STATUSES['violator'],)) as cursor:
+        for row in await cursor.fetchall():
             users.append({'user_id': row[0], 'chat_id': row[1]})
     return users
 
-async def delete_user(user_id):
-    
-    await db_connection.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
-    await db_connection.commit()
-    logger.info(f"Пользователь {user_id} удалён из базы данных")
-
-
-#################################
-#################################
-#################################
-
-# Получение списка запрещённых слов в никнеймах
-async def get_forbidden_nickname_words():
-    async with cache_lock:
-        return forbidden_nickname_words_cache.copy()
-
-# Добавление запрещённого слова в никнейме
-async def add_forbidden_nickname_word(word):
-    word_lower = word.lower()
-    async with cache_lock:
-        if word_lower not in forbidden_nickname_words_cache:
-            await db_connection.execute('INSERT OR IGNORE INTO forbidden_nickname_words (word) VALUES (?)', (word_lower,))
-            await db_connection.commit()
-            forbidden_nickname_words_cache.add(word_lower)
-            logger.info(f"Добавлено запрещённое слово в никнейме: {word_lower}")
-
-# Удаление запрещённого слова в никнейме
-async def remove_forbidden_nickname_word(word):
-    word_lower = word.lower()
-    async with cache_lock:
-        if word_lower in forbidden_nickname_words_cache:
-            await db_connection.execute('DELETE FROM forbidden_nickname_words WHERE word = ?', (word_lower,))
-            await db_connection.commit()
-            forbidden_nickname_words_cache.remove(word_lower)
-            logger.info(f"Удалено запрещённое слово в никнейме: {word_lower}")
-
-# Получение списка запрещённых эмодзи в никнеймах
-async def get_forbidden_nickname_emojis():
-    async with cache_lock:
-        return forbidden_nickname_emojis_cache.copy()
-
-# Добавление запрещённого эмодзи в никнейме
-async def add_forbidden_nickname_emoji(emoji):
-    async with cache_lock:
-        if emoji not in forbidden_nickname_emojis_cache:
-            await db_connection.execute('INSERT OR IGNORE INTO forbidden_nickname_emojis (emoji) VALUES (?)', (emoji,))
-            await db_connection.commit()
-            forbidden_nickname_emojis_cache.add(emoji)
-            logger.info(f"Добавлено запрещённое эмодзи в никнейме: {emoji}")
-
-# Удаление запрещённого эмодзи в никнейме
-async def remove_forbidden_nickname_emoji(emoji):
-    async with cache_lock:
-        if emoji in forbidden_nickname_emojis_cache:
-            await db_connection.execute('DELETE FROM forbidden_nickname_emojis WHERE emoji = ?', (emoji,))
-            await db_connection.commit()
-            forbidden_nickname_emojis_cache.remove(emoji)
-            logger.info(f"Удалено запрещённое эмодзи в никнейме: {emoji}")
-
-async def add_banned_user(user_id):
-    async with cache_lock:
-        await db_connection.execute('UPDATE users SET status = "banned" WHERE user_id = ?', (user_id,))
-        await db_connection.commit()
+# Страница пользователей со статусом (во всех чатах) для админ-панели: до limit записей по возрастанию id,
+# следующих за after_id или предшествующих before_id (keyset-пагинация по индексу idx_users_status,
+# в котором записи одного статуса уже упорядочены по id). Без курсора — первая страница
+async def get_users_page(status, limit, after_id=None, before_id=None):
+    await flush_user_writes()
+    if before_id is not None:
+        query = 'SELECT id, user_id, chat_id FROM users WHERE status = ? AND id < ? ORDER BY id DESC LIMIT ?'
+        params = (USER_STATUSES[status], before_id, limit)
+    elif after_id is not None:
+        query = 'SELECT id, user_id, chat_id FROM users WHERE status = ? AND id > ? ORDER BY id LIMIT ?'
+        params = (USER_STATUSES[status], after_id, limit)
+    else:
+        query = 'SELECT id, user_id, chat_id FROM users WHERE status = ? ORDER BY id LIMIT ?'
+        params = (USER_STATUSES[status], limit)
+    async with list_readers.execute(query, params) as cursor:
+        users = [{'id': row[0], 'user_id': row[1], 'chat_id': row[2]} for row in await cursor.fetchall()]
+    if before_id is not None:
+        users.reverse()
+    return users
 
-async def update_status_to_normal(user_id):
-    async with cache_lock:
-        await db_connection.execute('UPDATE users SET status = "normal" WHERE user_id = ?', (user_id,))
-        await db_connection.commit()
+# Число пользователей со статусом (считается по индексу, без чтения строк таблицы)
+async def count_users_with_status(status):
+    await flush_user_writes()
+    async with list_readers.execute('SELECT COUNT(*) FROM users WHERE status = ?', (USER_STATUSES[status],)) as cursor:
+        return (await cursor.fetchone())[0]
+
+async def delete_user(user_id, chat_id):
+    _write_user((user_id, chat_id), None)
+    logger.info(f"Пользователь {user_id} чата {chat_id} удалён из базы данных")
+
+
+
+async def add_banned_user(user_id, chat_id):
+    await _update_user_fields(user_id, chat_id, status='banned')
+
+async def update_status_to_normal(user_id, chat_id):
+    await _update_user_fields(user_id, chat_id, status='normal')
+
+# Массовые операции админ-панели над списком пар (user_id, chat_id): один запрос и один коммит на весь список.
+# Сначала сохраняются отложенные изменения (иначе они перезаписали бы результат), после коммита
+# строки убираются из кэша пользователей. Возвращают число изменённых строк
+async def _apply_users_bulk(query, params):
+    if not params:
+        return 0
+    await flush_user_writes()
+    async with write_transaction():
+        cursor = await db_connection.executemany(query, params)
+    for row in params:
+        _forget_user(tuple(row[-2:]))
+    return cursor.rowcount
+
+async def set_users_status_bulk(users, status):
+    count = await _apply_users_bulk(
+        'UPDATE users SET status = ? WHERE user_id = ? AND chat_id = ?',
+        [(USER_STATUSES[status], user_id, chat_id) for user_id, chat_id in users]
+    )
+    logger.info(f"Статус {status} установлен пользователям: {count}")
+    return count
+
+async def delete_users_bulk(users):
+    count = await _apply_users_bulk(
+        'DELETE FROM users WHERE user_id = ? AND chat_id = ?', [(user_id, chat_id) for user_id, chat_id in users]
+    )
+    logger.info(f"Удалено пользователей из базы данных: {count}")
+    return count
+
+# Снятие мутов: счётчик мутов сбрасывается, статус становится обычным (как add_or_update_user(id, chat, 0, None))
+async def reset_users_mutes_bulk(users):
+    count = await _apply_users_bulk(
+        'UPDATE users SET mute_count = 0, last_mute_time = NULL, status = ? WHERE user_id = ? AND chat_id = ?',
+        [(USER_STATUSES['normal'], user_id, chat_id) for user_id, chat_id in users]
+    )
+    logger.info(f"Сброшены муты пользователей: {count}")
+    return count
 
 
 # функция для получения пользователей с определёнными статусами
 async def get_users_with_statuses(status_list):
+    await flush_user_writes()
     users = []
     placeholders = ', '.join('?' * len(status_list))
     query = f'SELECT user_id, chat_id, status FROM users WHERE status IN ({placeholders})'
-    async with db_connection.execute(query, status_list) as cursor:
-        async for row in cursor:
-            users.append({'user_id': row[0], 'chat_id': row[1], 'status': row[2]})
+    async with list_readers.execute(query, [USER_STATUSES[status] for status in status_list]) as cursor:
+        for row in await cursor.fetchall():
+            users.append({'user_id': row[0], 'chat_id': row[1], 'status': USER_STATUS_NAMES.get(row[2], 'normal')})
     return users
 
 # Функция проверки, находится ли пользователь в чате
@@ -380,24 +1250,20 @@ async def is_user_in_chat(chat_id: int, user_id: int) -> bool:
     except Exception:
         return False
 
-# Функция обновления списка пользователей
+# Функция обновления списка пользователей: каждый проверяется в том чате, к которому относится его строка
 async def update_user_list():
-    from config.config_bot import GROUP_ID  # Импортируем ваш chat_id
-    chat_id = GROUP_ID  # Замените на ваш chat_id
     users_to_check = await get_users_with_statuses(['violator', 'suspicious'])
     for user in users_to_check:
-        user_id = user['user_id']
+        user_id, chat_id = user['user_id'], user['chat_id']
         if not await is_user_in_chat(chat_id, user_id):
-            await delete_user(user_id)
+            await delete_user(user_id, chat_id)
             logger.info(f"Пользователь {user_id} удален из базы данных, так как он больше не в чате и имел статус {user['status']}.")
 
 
 async def update_user_banned_list():
-    from config.config_bot import GROUP_ID  # Импортируем ваш chat_id
-    chat_id = GROUP_ID  # Замените на ваш chat_id
     users_to_check = await get_users_with_statuses(['banned'])
     for user in users_to_check:
-        user_id = user['user_id']
+        user_id, chat_id = user['user_id'], user['chat_id']
         if not await is_user_in_chat(chat_id, user_id):
-            await delete_user(user_id)
+            await delete_user(user_id, chat_id)
             logger.info(f"Пользователь {user_id} удален из базы данных, так как он больше не в чате и имел статус {user['status']}.")
\ No newline at end of file
@@ -3,27 +3,24 @@
 ##############
 
 from aiogram.enums import ParseMode
-import logging, math
+import logging
 from aiogram import F, Router
 from aiogram.types import (
     CallbackQuery, InlineKeyboardButton,
     InlineKeyboardMarkup, ChatPermissions
 )
-from show_handlers import is_user_admin
-from config.config_bot import bot, GROUP_ID
+from show_handlers import is_user_admin, load_users_page, page_navigation_buttons
+from config.config_bot import bot
 from database import (
 
     get_user_data, delete_user, update_user_list,
-    get_suspicious_users, get_violator_users, add_banned_user
+    get_suspicious_users, get_violator_users, add_banned_user, set_users_status_bulk
 
 )
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 router = Router()
 
-# Константы для пагинации
-USERS_PER_PAGE = 10
-
 # Обработчик для меню "Подозрения"
 @router.callback_query(lambda c: c.data == 'suspicions_menu')
 async def show_suspicions_menu(callback_query: CallbackQuery):
@@ -42,28 +39,9 @@ async def show_suspicious_users(callback_query: CallbackQuery):
     if not await is_user_admin(user_id):
         return
 
-    # Извлекаем номер страницы из callback_data
-    try:
-        parts = callback_query.data.split('_')
-        if len(parts) > 3:
-            # Предполагаем формат: show_suspicious_users_page_X
-            page_number = int(parts[-1])
-        else:
-            page_number = 1
-    except:
-        page_number = 1
-
-    suspicious_users = await get_suspicious_users()
-
-    if suspicious_users:
-        total_users = len(suspicious_users)
-        total_pages = math.ceil(total_users / USERS_PER_PAGE)
-        page_number = max(1, min(page_number, total_pages))  # Ограничиваем номер страницы
-
-        start_index = (page_number - 1) * USERS_PER_PAGE
-        end_index = start_index + USERS_PER_PAGE
-        current_page_users = suspicious_users[start_index:end_index]
+    current_page_users, page_number, total_pages = await load_users_page('suspicious', callback_query.data)
 
+    if current_page_users:
         keyboard_buttons = []
         for user in current_page_users:
             # Получаем полное имя пользователя через API
@@ -81,26 +59,12 @@ async def show_suspicious_users(callback_query: CallbackQuery):
 
             button = InlineKeyboardButton(
                 text=user_text,
-                callback_data=f"select_suspicious_user_{user['user_id']}"
+                callback_data=f"select_suspicious_user_{user['user_id']}_{user['chat_id']}"
             )
             keyboard_buttons.append([button])  # Каждая кнопка в отдельной строке
 
         # Кнопки навигации
-        navigation_buttons = []
-        if page_number > 1:
-            navigation_buttons.append(
-                InlineKeyboardButton(
-                    text="⬅️ Назад",
-                    callback_data=f"show_suspicious_users_page_{page_number - 1}"
-                )
-            )
-        if page_number < total_pages:
-            navigation_buttons.append(
-                InlineKeyboardButton(
-                    text="Вперед ➡️",
-                    callback_data=f"show_suspicious_users_page_{page_number + 1}"
-                )
-            )
+        navigation_buttons = page_navigation_buttons('show_suspicious_users', current_page_users, page_number, total_pages)
 
         # Добавляем кнопки навигации, если необходимо
         if navigation_buttons:
@@ -169,12 +133,12 @@ async def select_suspicious_user(callback_query: CallbackQuery):
         return
 
     try:
-        selected_user_id = int(callback_query.data.split('_')[-1])
+        selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
     except ValueError:
         await callback_query.answer("Некорректный ID пользователя.", show_alert=True)
         return
 
-    user_data = await get_user_data(selected_user_id)
+    user_data = await get_user_data(selected_user_id, selected_chat_id)
     if user_data:
         try:
             user_chat = await bot.get_chat(selected_user_id)
@@ -193,13 +157,13 @@ async def select_suspicious_user(callback_query: CallbackQuery):
             [
                 InlineKeyboardButton(
                     text="✅ Забанить",
-                    callback_data=f"ban_suspicious_user_{selected_user_id}"
+                    callback_data=f"ban_suspicious_user_{selected_user_id}_{selected_chat_id}"
                 )
             ],
             [
                 InlineKeyboardButton(
                     text="🚫 Удалить из пула",
-                    callback_data=f"remove_suspicious_user_{selected_user_id}"
+                    callback_data=f"remove_suspicious_user_{selected_user_id}_{selected_chat_id}"
                 )
             ],
             [
@@ -235,24 +199,9 @@ async def show_violator_users(callback_query: CallbackQuery):
         await callback_query.answer("У вас нет прав для выполнения этого действия.", show_alert=True)
         return
 
-    # Извлекаем номер страницы из callback_data
-    try:
-        _, _, page = callback_query.data.partition('_')
-        page_number = int(page) if page.isdigit() else 1
-    except:
-        page_number = 1
-
-    violator_users = await get_violator_users()
-
-    if violator_users:
-        total_users = len(violator_users)
-        total_pages = math.ceil(total_users / USERS_PER_PAGE)
-        page_number = max(1, min(page_number, total_pages))  # Ограничиваем номер страницы
-
-        start_index = (page_number - 1) * USERS_PER_PAGE
-        end_index = start_index + USERS_PER_PAGE
-        current_page_users = violator_users[start_index:end_index]
+    current_page_users, page_number, total_pages = await load_users_page('violator', callback_query.data)
 
+    if current_page_users:
         keyboard_buttons = []
         for user in current_page_users:
             try:
@@ -266,15 +215,11 @@ async def show_violator_users(callback_query: CallbackQuery):
                     user_text = f"@{username}"
             except:
                 user_text = f"ID: {user['user_id']}"
-            button = InlineKeyboardButton(text=user_text, callback_data=f"select_violator_user_{user['user_id']}")
+            button = InlineKeyboardButton(text=user_text, callback_data=f"select_violator_user_{user['user_id']}_{user['chat_id']}")
             keyboard_buttons.append([button])  # Каждая кнопка в отдельной строке
 
         # Кнопки навигации
-        navigation_buttons = []
-        if page_number > 1:
-            navigation_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"show_violator_users_{page_number - 1}"))
-        if page_number < total_pages:
-            navigation_buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"show_violator_users_{page_number + 1}"))
+        navigation_buttons = page_navigation_buttons('show_violator_users', current_page_users, page_number, total_pages)
 
         # Добавляем кнопки навигации, если необходимо
         if navigation_buttons:
@@ -317,12 +262,12 @@ async def select_violator_user(callback_query: CallbackQuery):
         return
 
     try:
-        selected_user_id = int(callback_query.data.split('_')[-1])
+        selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
     except ValueError:
         await callback_query.answer("Некорректный ID пользователя.", show_alert=True)
         return
 
-    user_data = await get_user_data(selected_user_id)
+    user_data = await get_user_data(selected_user_id, selected_chat_id)
     if user_data:
         try:
             user_chat = await bot.get_chat(selected_user_id)
@@ -338,8 +283,8 @@ async def select_violator_user(callback_query: CallbackQuery):
             user_profile_link = f"ID: {selected_user_id}"
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="✅ Забанить", callback_data=f"ban_violator_user_{selected_user_id}")],
-            [InlineKeyboardButton(text="🚫 Удалить из пула", callback_data=f"remove_violator_user_{selected_user_id}")],
+            [InlineKeyboardButton(text="✅ Забанить", callback_data=f"ban_violator_user_{selected_user_id}_{selected_chat_id}")],
+            [InlineKeyboardButton(text="🚫 Удалить из пула", callback_data=f"remove_violator_user_{selected_user_id}_{selected_chat_id}")],
             [InlineKeyboardButton(text="❌ Отмена", callback_data="close_message")]
         ])
 
@@ -368,14 +313,14 @@ async def ban_suspicious_user(callback_query: CallbackQuery):
     if not await is_user_admin(admin_user_id):
         return
     message_id = callback_query.message.message_id
-    selected_user_id = int(callback_query.data.split('_')[-1])
-    user_data = await get_user_data(selected_user_id)
+    selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
+    user_data = await get_user_data(selected_user_id, selected_chat_id)
 
     if user_data:
         chat_id = user_data['chat_id']
         try:
             await callback_query.bot.ban_chat_member(chat_id=chat_id, user_id=selected_user_id)
-            await add_banned_user(selected_user_id)
+            await add_banned_user(selected_user_id, selected_chat_id)
             await callback_query.answer(f"Пользователь {selected_user_id} забанен.", show_alert=True)
             await callback_query.message.delete()
             logger.info(f"Пользователь {selected_user_id} забанен администратором {admin_user_id}.")
@@ -390,30 +335,29 @@ async def ban_suspicious_user(callback_query: CallbackQuery):
 # Обработчик удаления подозрительного пользователя из пула
 @router.callback_query(lambda c: c.data.startswith('remove_suspicious_user_'))
 async def remove_suspicious_user(callback_query: CallbackQuery):
-    chat_id = GROUP_ID
     user_id = callback_query.from_user.id
     if not await is_user_admin(user_id):
         return
 
-    selected_user_id = int(callback_query.data.split('_')[-1])
+    selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
     try:
-        member = await bot.get_chat_member(chat_id, selected_user_id)
+        member = await bot.get_chat_member(selected_chat_id, selected_user_id)
         status = member.status
     
         await bot.restrict_chat_member(
-                    chat_id=chat_id,
+                    chat_id=selected_chat_id,
                     user_id=selected_user_id,
                     permissions=ChatPermissions(
                         can_send_messages=True
                     )
                 )
         
-        await delete_user(selected_user_id)
+        await delete_user(selected_user_id, selected_chat_id)
         await callback_query.answer(f"Пользователь {selected_user_id} удалён из пула.", show_alert=True)
         # await send_nickname_change_request(selected_user_id)
         await callback_query.message.delete()
     except Exception as e:
-        await delete_user(selected_user_id)
+        await delete_user(selected_user_id, selected_chat_id)
         await callback_query.answer(f"Пользователь {selected_user_id} удалён из пула.", show_alert=True)
         # await send_nickname_change_request(selected_user_id)
         await callback_query.message.delete()
@@ -473,20 +417,25 @@ async def ban_all_suspicious_confirm(callback_query: CallbackQuery):
         await callback_query.message.delete()
         return
 
-    success_count = 0
+    banned_users = []
     for user in suspicious_users:
         user_id = user['user_id']
         chat_id = user['chat_id']
         try:
             # Баним пользователя
             await callback_query.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
-            # Удаляем пользователя из пула
-            await add_banned_user(user_id)
-            success_count += 1
+            banned_users.append((user_id, chat_id))
             logger.info(f"Пользователь {user_id} забанен администратором {admin_user_id}.")
         except Exception as e:
             logger.error(f"Ошибка при бане пользователя {user_id}: {e}")
 
+    # Статус в базе меняется для всех забаненных сразу, одной транзакцией
+    success_count = len(banned_users)
+    try:
+        await set_users_status_bulk(banned_users, 'banned')
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении статуса забаненных пользователей: {e}")
+
     await callback_query.answer(f"Забанено пользователей: {success_count}.", show_alert=True)
     await callback_query.message.delete()
 
@@ -501,14 +450,14 @@ async def ban_violator_user(callback_query: CallbackQuery):
     if not await is_user_admin(admin_user_id):
         return
 
-    selected_user_id = int(callback_query.data.split('_')[-1])
-    user_data = await get_user_data(selected_user_id)
+    selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
+    user_data = await get_user_data(selected_user_id, selected_chat_id)
 
     if user_data:
         chat_id = user_data['chat_id']
         try:
             await callback_query.bot.ban_chat_member(chat_id=chat_id, user_id=selected_user_id)
-            await add_banned_user(selected_user_id)
+            await add_banned_user(selected_user_id, selected_chat_id)
             await callback_query.answer(f"Пользователь {selected_user_id} забанен.", show_alert=True)
             await callback_query.message.delete()
             logger.info(f"Пользователь {selected_user_id} забанен администратором {admin_user_id}.")
@@ -523,29 +472,28 @@ async def ban_violator_user(callback_query: CallbackQuery):
 @router.callback_query(lambda c: c.data.startswith('remove_violator_user_'))
 async def remove_violator_user(callback_query: CallbackQuery):
     user_id = callback_query.from_user.id
-    chat_id = callback_query.message.chat.id
     if not await is_user_admin(user_id):
         return
     
-    selected_user_id = int(callback_query.data.split('_')[-1])
+    selected_user_id, selected_chat_id = map(int, callback_query.data.split('_')[-2:])
     try:
-        member = await bot.get_chat_member(chat_id, selected_user_id)
+        member = await bot.get_chat_member(selected_chat_id, selected_user_id)
         status = member.status
     
         await bot.restrict_chat_member(
-                    chat_id=chat_id,
+                    chat_id=selected_chat_id,
                     user_id=selected_user_id,
                     permissions=ChatPermissions(
                         can_send_messages=True
                     )
                 )
         
-        await delete_user(selected_user_id)
+        await delete_user(selected_user_id, selected_chat_id)
         await callback_query.answer(f"Пользователь {selected_user_id} удалён из пула.", show_alert=True)
         # await send_nickname_change_request(selected_user_id)
         await callback_query.message.delete()
     except Exception as e:
-        await delete_user(selected_user_id)
+        await delete_user(selected_user_id, selected_chat_id)
         await callback_query.answer(f"Пользователь {selected_user_id} удалён из пула.", show_alert=True)
         # await send_nickname_change_request(selected_user_id)
         await callback_query.message.delete()
@@ -594,17 +542,23 @@ async def ban_all_violators_confirm(callback_query: CallbackQuery):
         await callback_query.message.delete()
         return
 
-    success_count = 0
+    banned_users = []
     for user in violator_users:
         user_id = user['user_id']
         chat_id = user['chat_id']
         try:
             await callback_query.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
-            await add_banned_user(user_id)
-            success_count += 1
+            banned_users.append((user_id, chat_id))
             logger.info(f"Пользователь {user_id} забанен администратором {admin_user_id}.")
         except Exception as e:
             logger.error(f"Ошибка при бане пользователя {user_id}: {e}")
 
+    # Статус в базе меняется для всех забаненных сразу, одной транзакцией
+    success_count = len(banned_users)
+    try:
+        await set_users_status_bulk(banned_users, 'banned')
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении статуса забаненных пользователей: {e}")
+
     await callback_query.answer(f"Забанено пользователей: {success_count}.", show_alert=True)
     await callback_query.message.delete()
\ No newline at end of file
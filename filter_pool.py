@@ -0,0 +1,174 @@
+# filter_pool.py
+# Проверка текстов на запрещённые слова в отдельных процессах,
+# чтобы тяжёлое сканирование не блокировало цикл событий бота
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from text_filter import ForbiddenMatcher, ScanProfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Режимы выполнения фильтра (настройка filter_execution_mode)
+MODE_INLINE = 'inline'
+MODE_PROCESS = 'process'
+
+# Один процессор оставляем циклу событий
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Пауза перед повторным запуском пула после ошибки, секунды
+RETRY_DELAY = 60
+
+# Сколько правок списка слов передаётся процессам вместе с проверкой.
+# Если правок больше, процессы перезапускаются с полным списком (как MATCHER_MAX_DELTA в database.py)
+MAX_DELTA = 200
+
+# Правила, с которыми запущен рабочий процесс, и собранный по ним поиск
+_worker_rules = None
+_worker_base = None
+# Поиск для последней версии правил, которую проверял процесс
+_worker_version = None
+_worker_matcher = None
+
+
+def _init_worker(version, rules):
+    global _worker_rules, _worker_base, _worker_version, _worker_matcher
+    _worker_rules = rules
+    _worker_base = _worker_matcher = ForbiddenMatcher(rules)
+    _worker_version = version
+
+
+def _worker_ready():
+    return _worker_matcher is not None
+
+
+# Если версия правил изменилась, процесс применяет правки к своему списку
+# и дособирает поиск поверх базовых выражений, не компилируя весь список заново
+def _scan_in_worker(version, delta, text, threshold):
+    global _worker_version, _worker_matcher
+    if version != _worker_version:
+        changed, removed = delta
+        rules = {word: rule_type for word, rule_type in _worker_rules.items() if word not in removed}
+        rules.update(changed)
+        _worker_matcher, _worker_version = _worker_base.updated(rules), version
+    profile = ScanProfile()
+    return _worker_matcher.scan(text, threshold, profile), profile
+
+
+def _scan_inline(matcher, text, threshold):
+    profile = ScanProfile()
+    return matcher.scan(text, threshold, profile), profile
+
+
+class FilterPool:
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._version = None
+        # Правила, с которыми запущены процессы, и правки к ним для последней проверенной версии
+        self._rules = {}
+        self._delta = (None, None)
+        # Версия, для которой сейчас поднимаются новые процессы
+        self._pending_version = None
+        self._refresh_task = None
+        self._failed_at = None
+        # Растёт при каждой остановке: процессы, запущенные до неё, не устанавливаются
+        self._generation = 0
+
+    # Новые процессы получают список правил один раз при запуске и собирают их сами.
+    # Пока они запускаются, проверки идут через прежние процессы с правками или в текущем процессе
+    async def _start_executor(self, version, rules):
+        self._pending_version = version
+        generation = self._generation
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(version, rules),
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, _worker_ready) for _ in range(self.max_workers)
+            ))
+        except Exception:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            if self._pending_version == version:
+                self._pending_version = None
+
+        if generation != self._generation or (self._version is not None and self._version > version):
+            # Пока запускались процессы, пул остановили или уже поднялась более новая версия
+            executor.shutdown(wait=False)
+            return
+        old_executor, self._executor, self._version = self._executor, executor, version
+        self._rules, self._delta = rules, (None, None)
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+        logger.info(f"Запущены процессы фильтра: {self.max_workers}, версия правил {version}")
+
+    async def _refresh_executor(self, version, rules):
+        try:
+            await self._start_executor(version, rules)
+        except Exception as e:
+            logger.error(f"Не удалось запустить процессы фильтра для версии {version}: {e}")
+
+    # Правки версии version относительно правил, с которыми запущены процессы:
+    # (новые и изменённые слова, удалённые слова) или None, если правок больше MAX_DELTA
+    def _delta_for(self, version, rules):
+        if self._delta[0] != version:
+            changed = {word: rule_type for word, rule_type in rules.items() if self._rules.get(word) != rule_type}
+            removed = frozenset(word for word in self._rules if word not in rules)
+            delta = (changed, removed) if len(changed) + len(removed) <= MAX_DELTA else None
+            self._delta = (version, delta)
+        return self._delta[1]
+
+    # Возвращает запрещённое слово в нормализованном тексте (или None) и замеры проверки (ScanProfile).
+    # Процессы проверяют ровно ту версию правил, которую передали: небольшие правки приходят вместе
+    # с текстом, а если их накопилось много, процессы перезапускаются, и до этого проверка идёт в текущем процессе.
+    # При ошибке пула проверка выполняется в текущем процессе, а пул не используется RETRY_DELAY секунд
+    async def scan(self, version, matcher, text, threshold):
+        loop = asyncio.get_running_loop()
+        if self._failed_at is not None and loop.time() - self._failed_at < RETRY_DELAY:
+            return _scan_inline(matcher, text, threshold)
+
+        try:
+            if self._executor is None:
+                if self._pending_version is not None:
+                    # Первый пул ещё запускается другим сообщением
+                    return _scan_inline(matcher, text, threshold)
+                await self._start_executor(version, matcher.rules)
+                if self._executor is None:
+                    # Пул остановили, пока процессы запускались
+                    return _scan_inline(matcher, text, threshold)
+            delta = self._delta_for(version, matcher.rules)
+            if delta is None:
+                if self._pending_version is None:
+                    self._pending_version = version
+                    self._refresh_task = asyncio.create_task(self._refresh_executor(version, matcher.rules))
+                return _scan_inline(matcher, text, threshold)
+            result = await loop.run_in_executor(self._executor, _scan_in_worker, version, delta, text, threshold)
+            self._failed_at = None
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка пула процессов фильтра, проверка выполнена в основном процессе: {e}")
+            self._failed_at = loop.time()
+            self.shutdown()
+            return _scan_inline(matcher, text, threshold)
+
+    # Остановка процессов (при выходе, ошибке пула или переключении фильтра в основной процесс).
+    # Следующая проверка в режиме процессов запустит пул заново
+    def shutdown(self):
+        self._generation += 1
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._version = None
+        self._rules, self._delta = {}, (None, None)
+
+
+filter_pool = FilterPool()
@@ -12,6 +12,7 @@ import mute_handlers as router_mute
 import podozr_handlers as router_podozr
 import ero_handlers as router_ero
 from middlewares.anti_spam import AntiSpamMiddleware
+from filter_pool import filter_pool
 
 
 async def main():
@@ -27,6 +28,9 @@ async def main():
     # Подключаем мидлвар
     dp.message.middleware(AntiSpamMiddleware())
 
+    # Периодическая запись статистики правил фильтра в базу
+    asyncio.create_task(router_zapret.flush_rule_stats_periodically())
+
     await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot)
     # await stress_test(bot, dp)
@@ -34,10 +38,18 @@ async def main():
     # # Закрываем сессию бота
     # await bot.session.close()
 
+async def shutdown():
+    try:
+        await router_zapret.flush_rule_stats()
+    except Exception as e:
+        logging.error(f"Не удалось сохранить статистику правил: {e}")
+    await close_db()
+
 if __name__ == '__main__':
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print('Bot closed')
     finally:
-        asyncio.run(close_db())
+        filter_pool.shutdown()
+        asyncio.run(shutdown())
@@ -3,7 +3,7 @@ import asyncio
 import logging
 from aiogram import BaseMiddleware
 from aiogram.types import Message, ChatPermissions
-from database import get_setting, get_user, add_or_update_user, add_banned_user
+from database import get_settings, get_user, add_or_update_user, add_banned_user
 from datetime import datetime, timedelta
 from config.config_bot import ADMINS
 
@@ -12,17 +12,20 @@ logger = logging.getLogger(__name__)
 
 class AntiSpamMiddleware(BaseMiddleware):
     def __init__(self):
-        self.user_messages = {}  # Stores timestamps of user messages: {user_id: [timestamps]}
+        # State is kept per user in each chat, keyed by (chat_id, user_id)
+        self.user_messages = {}  # Stores timestamps of user messages: {(chat_id, user_id): [timestamps]}
         self.spam_incidents = {}  # Stores the time of the last spam incident per user
         self.user_locks = {}      # Locks for synchronizing access per user
         self.logger = logging.getLogger(__name__)
 
     async def __call__(self, handler, event: Message, data):
-        if await get_setting('anti_spam_enabled') == '0':
-            return await handler(event, data)
-
         user_id = event.from_user.id
         chat_id = event.chat.id
+        settings = get_settings(chat_id)
+        if not settings['anti_spam_enabled']:
+            return await handler(event, data)
+
+        key = (chat_id, user_id)
         current_time = datetime.now()
 
         if event.chat.type not in ['group', 'supergroup']:
@@ -32,11 +35,11 @@ class AntiSpamMiddleware(BaseMiddleware):
             return await handler(event, data)
 
         # Initialize a lock for the user if it doesn't exist
-        if user_id not in self.user_locks:
-            self.user_locks[user_id] = asyncio.Lock()
+        if key not in self.user_locks:
+            self.user_locks[key] = asyncio.Lock()
 
-        async with self.user_locks[user_id]:
-            user_data = await get_user(user_id)
+        async with self.user_locks[key]:
+            user_data = await get_user(user_id, chat_id)
             if user_data and user_data['mute_count'] >= 3:
                 try:
                     await event.bot.restrict_chat_member(
@@ -51,30 +54,31 @@ class AntiSpamMiddleware(BaseMiddleware):
 
             if user_data and user_data['last_mute_time']:
                 time_since_last_mute = current_time - user_data['last_mute_time']
-                if time_since_last_mute > timedelta(hours=1) and user_data['mute_count'] < 3:
+                if time_since_last_mute > timedelta(seconds=settings['mute_reset_seconds']) and user_data['mute_count'] < 3:
                     user_data['mute_count'] = 0
                     user_data['last_mute_time'] = None
                     await add_or_update_user(user_id, chat_id, user_data['mute_count'], user_data['last_mute_time'])
                     self.logger.info(f"Reset mute count for user {user_id} after {time_since_last_mute}.")
 
-            if user_id not in self.user_messages:
-                self.user_messages[user_id] = []
-            self.user_messages[user_id].append(current_time)
+            if key not in self.user_messages:
+                self.user_messages[key] = []
+            self.user_messages[key].append(current_time)
 
-            # Keep only messages within the last 2 seconds
-            self.user_messages[user_id] = [
-                timestamp for timestamp in self.user_messages[user_id]
-                if current_time - timestamp <= timedelta(seconds=2)
+            # Keep only messages within the spam window
+            spam_window = timedelta(seconds=settings['spam_window_seconds'])
+            self.user_messages[key] = [
+                timestamp for timestamp in self.user_messages[key]
+                if current_time - timestamp <= spam_window
             ]
 
-            if len(self.user_messages[user_id]) >= 3:
+            if len(self.user_messages[key]) >= settings['spam_message_limit']:
                 # Check if the user had a recent spam incident
-                last_spam_time = self.spam_incidents.get(user_id)
-                if not last_spam_time or current_time - last_spam_time > timedelta(seconds=10):
+                last_spam_time = self.spam_incidents.get(key)
+                if not last_spam_time or current_time - last_spam_time > timedelta(seconds=settings['spam_cooldown_seconds']):
                     # Increase mute count and save the incident time
                     await self.handle_spammer(event, user_id, chat_id, reason="spam")
-                    self.spam_incidents[user_id] = current_time
-                    self.user_messages[user_id] = []  # Reset message list after handling
+                    self.spam_incidents[key] = current_time
+                    self.user_messages[key] = []  # Reset message list after handling
                 else:
                     # Delete the message as a warning
                     await event.bot.delete_message(chat_id=chat_id, message_id=event.message_id)
@@ -88,7 +92,7 @@ class AntiSpamMiddleware(BaseMiddleware):
         
         try:
             await event.bot.delete_message(chat_id=chat_id, message_id=event.message_id)
-            user_data = await get_user(user_id)
+            user_data = await get_user(user_id, chat_id)
             if not user_data:
                 user_data = {'user_id': user_id, 'chat_id': chat_id, 'mute_count': 0, 'last_mute_time': None,'status': 'normal'}
             else:
@@ -120,7 +124,7 @@ class AntiSpamMiddleware(BaseMiddleware):
                 self.logger.info(f"User {user_id} temporarily muted for 10 minutes for repeated {reason}.")
                 asyncio.create_task(self.unmute_user_after_delay(event.bot, chat_id, user_id, delay=600))
             elif user_data['mute_count'] >= 3:
-                add_banned_user(user_id)
+                await add_banned_user(user_id, chat_id)
                 await event.bot.restrict_chat_member(
                     chat_id=chat_id,
                     user_id=user_id,
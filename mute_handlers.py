@@ -8,7 +8,7 @@ from aiogram.types import (
 
 from database import (
 
-    get_users_with_mutes_less_than_3,add_or_update_user
+    get_users_with_mutes_less_than_3, reset_users_mutes_bulk
 
 )
 from show_handlers import is_user_admin
@@ -64,6 +64,7 @@ async def unban_users_confirm(callback_query: CallbackQuery):
 
     users_to_unban = await get_users_with_mutes_less_than_3()
 
+    unbanned_users = []
     for user in users_to_unban:
         try:
             await callback_query.bot.restrict_chat_member(
@@ -71,10 +72,16 @@ async def unban_users_confirm(callback_query: CallbackQuery):
                 user_id=user['user_id'],
                 permissions=ChatPermissions(can_send_messages=True)
             )
-            await add_or_update_user(user['user_id'], user['chat_id'], 0, None)
+            unbanned_users.append((user['user_id'], user['chat_id']))
             # logger.info(f"Пользователь {user['user_id']} разблокирован и счетчик мутов сброшен.")
         except Exception as e:
             logger.error(f"Ошибка при разблокировке пользователя {user['user_id']}: {e}")
 
+    # Счётчики мутов сбрасываются для всех разблокированных сразу, одной транзакцией
+    try:
+        await reset_users_mutes_bulk(unbanned_users)
+    except Exception as e:
+        logger.error(f"Ошибка при сбросе счётчиков мутов: {e}")
+
     await callback_query.answer("Все пользователи с мутами меньше 3 разблокированы.")
     await callback_query.message.delete()
\ No newline at end of file
@@ -11,10 +11,12 @@ from aiogram.types import (
 
 from aiogram.fsm.context import FSMContext
 
-from show_handlers import is_user_admin, FunctionStates
+from show_handlers import (
+    is_user_admin, get_admin_chat, FunctionStates, read_list_entries, describe_list_entries, make_list_document
+)
 from database import (
-    get_forbidden_nickname_emojis, get_forbidden_nickname_words, add_forbidden_nickname_emoji, 
-    add_forbidden_nickname_word, remove_forbidden_nickname_emoji, remove_forbidden_nickname_word
+    get_forbidden_nickname_emojis, get_forbidden_nickname_words, add_forbidden_nickname_emojis_bulk,
+    add_forbidden_nickname_words_bulk, remove_forbidden_nickname_emojis_bulk, remove_forbidden_nickname_words_bulk
 )
 router = Router()
 @router.callback_query(lambda c: c.data == "add_nickname_words")
@@ -26,7 +28,8 @@ async def process_add_nickname_words(callback_query: CallbackQuery, state: FSMCo
     await callback_query.message.answer(
         "Пожалуйста, введите слова для <b>добавления в запрещённые никнеймы</b>. "
         "Вы можете вводить несколько слов через пробел или фразы в кавычках.\n"
-        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>",
+        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>\n"
+        "Можно отправить файл .txt (по слову или фразе в строке) или .csv.",
         parse_mode='HTML'
     )
     await state.set_state(FunctionStates.waiting_for_nickname_words_to_add)
@@ -39,23 +42,18 @@ async def add_nickname_words_handler(message: Message, state: FSMContext):
     if not await is_user_admin(user_id):
         return
 
-    text = message.text
-
-    import shlex
     try:
-        words_to_add = shlex.split(text)
+        words_to_add = await read_list_entries(message)
     except ValueError as e:
         await message.answer(f"Ошибка при обработке введённых данных: {e}")
         return
 
-    added_words = []
-    for word in words_to_add:
-        await add_forbidden_nickname_word(word)
-        added_words.append(word.lower())
+    added_words = await add_forbidden_nickname_words_bulk(words_to_add, get_admin_chat(user_id))
 
     if added_words:
         await message.answer(
-            f"Слова/фразы <b>{', '.join(added_words)}</b> добавлены в список запрещённых слов для никнеймов.",
+            f"Слова/фразы <b>{describe_list_entries(added_words)}</b> добавлены в список запрещённых слов для никнеймов "
+            f"(всего добавлено: {len(added_words)}).",
             parse_mode='HTML'
         )
     else:
@@ -73,7 +71,8 @@ async def process_remove_nickname_words(callback_query: CallbackQuery, state: FS
     await callback_query.message.answer(
         "Пожалуйста, введите слова для <b>удаления из запрещённых никнеймов</b>. "
         "Вы можете вводить несколько слов через пробел или фразы в кавычках.\n"
-        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>",
+        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>\n"
+        "Можно отправить файл .txt (по слову или фразе в строке) или .csv.",
         parse_mode='HTML'
     )
     await state.set_state(FunctionStates.waiting_for_nickname_words_to_remove)
@@ -86,23 +85,18 @@ async def remove_nickname_words_handler(message: Message, state: FSMContext):
     if not await is_user_admin(user_id):
         return
 
-    text = message.text
-
-    import shlex
     try:
-        words_to_remove = shlex.split(text)
+        words_to_remove = await read_list_entries(message)
     except ValueError as e:
         await message.answer(f"Ошибка при обработке введённых данных: {e}")
         return
 
-    removed_words = []
-    for word in words_to_remove:
-        await remove_forbidden_nickname_word(word)
-        removed_words.append(word.lower())
+    removed_words = await remove_forbidden_nickname_words_bulk(words_to_remove, get_admin_chat(user_id))
 
     if removed_words:
         await message.answer(
-            f"Слова/фразы <b>{', '.join(removed_words)}</b> удалены из списка запрещённых слов для никнеймов.",
+            f"Слова/фразы <b>{describe_list_entries(removed_words)}</b> удалены из списка запрещённых слов для никнеймов "
+            f"(всего удалено: {len(removed_words)}).",
             parse_mode='HTML'
         )
     else:
@@ -117,7 +111,7 @@ async def process_show_forbidden_nickname_words(callback_query: CallbackQuery):
     if not await is_user_admin(user_id):
         return
 
-    forbidden_nickname_words = await get_forbidden_nickname_words()
+    forbidden_nickname_words = await get_forbidden_nickname_words(get_admin_chat(user_id))
     if forbidden_nickname_words:
         words_list = ', '.join(sorted(forbidden_nickname_words))
         message_text = f"🚫Запрещённые слова в никнеймах:\n{words_list}"
@@ -142,7 +136,8 @@ async def process_add_nickname_emojis(callback_query: CallbackQuery, state: FSMC
     await callback_query.message.answer(
         "Пожалуйста, введите эмодзи для <b>добавления в запрещённые никнеймы</b>. "
         "Вы можете вводить несколько эмодзи через пробел.\n"
-        "Пример: 😈 🤬",
+        "Пример: 😈 🤬\n"
+        "Можно отправить файл .txt (по эмодзи в строке) или .csv.",
         parse_mode='HTML'
     )
     await state.set_state(FunctionStates.waiting_for_nickname_emojis_to_add)
@@ -155,15 +150,17 @@ async def add_nickname_emojis_handler(message: Message, state: FSMContext):
     if not await is_user_admin(user_id):
         return
 
-    emojis_to_add = message.text.strip().split()
-    added_emojis = []
-    for emoji in emojis_to_add:
-        await add_forbidden_nickname_emoji(emoji)
-        added_emojis.append(emoji)
+    try:
+        emojis_to_add = await read_list_entries(message, split_text=str.split)
+    except ValueError as e:
+        await message.answer(f"Ошибка при обработке введённых данных: {e}")
+        return
+
+    added_emojis = await add_forbidden_nickname_emojis_bulk(emojis_to_add, get_admin_chat(user_id))
 
     if added_emojis:
         await message.answer(
-            f"Эмодзи <b>{' '.join(added_emojis)}</b> добавлены в список запрещённых эмодзи для никнеймов.",
+            f"Эмодзи <b>{describe_list_entries(added_emojis, separator=' ')}</b> добавлены в список запрещённых эмодзи для никнеймов.",
             parse_mode='HTML'
         )
     else:
@@ -180,7 +177,8 @@ async def process_remove_nickname_emojis(callback_query: CallbackQuery, state: F
     await callback_query.message.answer(
         "Пожалуйста, введите эмодзи для <b>удаления из запрещённых никнеймов</b>. "
         "Вы можете вводить несколько эмодзи через пробел.\n"
-        "Пример: 😈 🤬",
+        "Пример: 😈 🤬\n"
+        "Можно отправить файл .txt (по эмодзи в строке) или .csv.",
         parse_mode='HTML'
     )
     await state.set_state(FunctionStates.waiting_for_nickname_emojis_to_remove)
@@ -192,15 +190,17 @@ async def remove_nickname_emojis_handler(message: Message, state: FSMContext):
     if not await is_user_admin(user_id):
         return
 
-    emojis_to_remove = message.text.strip().split()
-    removed_emojis = []
-    for emoji in emojis_to_remove:
-        await remove_forbidden_nickname_emoji(emoji)
-        removed_emojis.append(emoji)
+    try:
+        emojis_to_remove = await read_list_entries(message, split_text=str.split)
+    except ValueError as e:
+        await message.answer(f"Ошибка при обработке введённых данных: {e}")
+        return
+
+    removed_emojis = await remove_forbidden_nickname_emojis_bulk(emojis_to_remove, get_admin_chat(user_id))
 
     if removed_emojis:
         await message.answer(
-            f"Эмодзи <b>{' '.join(removed_emojis)}</b> удалены из списка запрещённых эмодзи для никнеймов.",
+            f"Эмодзи <b>{describe_list_entries(removed_emojis, separator=' ')}</b> удалены из списка запрещённых эмодзи для никнеймов.",
             parse_mode='HTML'
         )
     else:
@@ -215,7 +215,7 @@ async def process_show_forbidden_nickname_emojis(callback_query: CallbackQuery):
     if not await is_user_admin(user_id):
         return
 
-    forbidden_nickname_emojis = await get_forbidden_nickname_emojis()
+    forbidden_nickname_emojis = await get_forbidden_nickname_emojis(get_admin_chat(user_id))
     if forbidden_nickname_emojis:
         emojis_list = ' '.join(sorted(forbidden_nickname_emojis))
         message_text = f"🚫Запрещённые эмодзи в никнеймах:\n{emojis_list}"
@@ -229,3 +229,31 @@ async def process_show_forbidden_nickname_emojis(callback_query: CallbackQuery):
     )
     await callback_query.message.answer(message_text, parse_mode='HTML', reply_markup=kb)
     await callback_query.answer()
+
+
+@router.callback_query(lambda c: c.data == 'export_forbidden_nickname_words')
+async def export_forbidden_nickname_words(callback_query: CallbackQuery):
+    user_id = callback_query.from_user.id
+    if not await is_user_admin(user_id):
+        return
+
+    forbidden_nickname_words = await get_forbidden_nickname_words(get_admin_chat(user_id))
+    await callback_query.message.answer_document(
+        make_list_document(forbidden_nickname_words, 'forbidden_nickname_words.txt'),
+        caption=f"Запрещённых слов в никнеймах: {len(forbidden_nickname_words)}"
+    )
+    await callback_query.answer()
+
+
+@router.callback_query(lambda c: c.data == 'export_forbidden_nickname_emojis')
+async def export_forbidden_nickname_emojis(callback_query: CallbackQuery):
+    user_id = callback_query.from_user.id
+    if not await is_user_admin(user_id):
+        return
+
+    forbidden_nickname_emojis = await get_forbidden_nickname_emojis(get_admin_chat(user_id))
+    await callback_query.message.answer_document(
+        make_list_document(forbidden_nickname_emojis, 'forbidden_nickname_emojis.txt'),
+        caption=f"Запрещённых эмодзи в никнеймах: {len(forbidden_nickname_emojis)}"
+    )
+    await callback_query.answer()
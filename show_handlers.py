@@ -1,11 +1,16 @@
 
 
 from aiogram.enums import ParseMode
+import io
+import math
+import csv
+import html
+import shlex
 import logging
 from aiogram import F, Router
 from aiogram.types import (
     Message, CallbackQuery, InlineKeyboardButton,
-    InlineKeyboardMarkup
+    InlineKeyboardMarkup, BufferedInputFile
 )
 
 from aiogram.filters import CommandStart
@@ -14,11 +19,13 @@ from aiogram.fsm.context import FSMContext
 
 
 
-from config.config_bot import bot, GROUP_ID, ADMINS, CHANNEL_ID
+from config.config_bot import bot, GROUP_ID, GROUP_IDS, ADMINS, CHANNEL_ID
 from database import (
     get_setting, update_setting,
+    get_users_page, count_users_with_status, GLOBAL_CHAT,
 
 )
+from filter_pool import filter_pool, MODE_INLINE, MODE_PROCESS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +35,7 @@ router = Router()
 class FunctionStates(StatesGroup):
     change_first_post_message = State()
     change_delete_message_count = State()
+    change_fuzzy_threshold = State()
     waiting_for_words_to_add = State()
     waiting_for_words_to_remove = State()
     waiting_for_nickname_words_to_add = State()
@@ -44,18 +52,114 @@ welcome_sent = {}  # Ключ: thread_id, Значение: True/False
 last_command_times = {}
 
 
+# Максимальный размер загружаемого файла со списком слов
+MAX_LIST_FILE_SIZE = 5 * 1024 * 1024
+
+
 # Проверка, является ли пользователь администратором
 async def is_user_admin(user_id):
     return str(user_id) in ADMINS
 
+# Чат, списки и настройки которого правит администратор: {id администратора: chat_id}.
+# По умолчанию GLOBAL_CHAT — общие списки и настройки для всех чатов
+admin_chats = {}
+
+def get_admin_chat(user_id):
+    return admin_chats.get(user_id, GLOBAL_CHAT)
+
+# Название чата для кнопок админ-панели
+async def describe_chat(chat_id):
+    if chat_id == GLOBAL_CHAT:
+        return "Все чаты"
+    try:
+        return (await bot.get_chat(chat_id)).title or str(chat_id)
+    except Exception:
+        return str(chat_id)
+
+# Разбор списка из сообщения администратора: текст разбивается функцией split_text,
+# в файле .txt — одно значение на строку, в файле .csv — каждая непустая ячейка
+async def read_list_entries(message: Message, split_text=shlex.split):
+    document = message.document
+    if document is None:
+        return split_text(message.text or '')
+
+    file_name = (document.file_name or '').lower()
+    if not file_name.endswith(('.txt', '.csv')):
+        raise ValueError("поддерживаются только файлы .txt и .csv")
+    if document.file_size and document.file_size > MAX_LIST_FILE_SIZE:
+        raise ValueError("файл больше 5 МБ")
+
+    content = (await message.bot.download(document)).read().decode('utf-8-sig')
+    if file_name.endswith('.csv'):
+        rows = csv.reader(io.StringIO(content))
+        return [cell.strip() for row in rows for cell in row if cell.strip()]
+    return [line.strip() for line in content.splitlines() if line.strip()]
+
+# Краткое перечисление значений для ответа администратору (длинные списки обрезаются)
+def describe_list_entries(entries, separator=', ', limit=50):
+    shown = separator.join(html.escape(entry) for entry in entries[:limit])
+    if len(entries) > limit:
+        shown += f" … и ещё {len(entries) - limit}"
+    return shown
+
+# Файл со списком для выгрузки: одно значение на строку
+def make_list_document(entries, file_name):
+    return BufferedInputFile('\n'.join(sorted(entries)).encode('utf-8'), filename=file_name)
+
+# Число пользователей на странице в списках админ-панели
+USERS_PER_PAGE = 10
+
+# Курсор страницы из callback_data вида "<префикс>:page=N:after=ID" или "<префикс>:page=N:before=ID".
+# Возвращает (номер страницы, after_id, before_id); без курсора — первая страница
+def parse_page_cursor(data):
+    cursor = {}
+    for part in data.split(':')[1:]:
+        key, _, value = part.partition('=')
+        if key in ('page', 'after', 'before') and value.lstrip('-').isdigit():
+            cursor[key] = int(value)
+    return cursor.get('page', 1), cursor.get('after'), cursor.get('before')
+
+# Страница пользователей со статусом по курсору из callback_data: (пользователи, номер страницы, всего страниц).
+# Из базы читается только сама страница и число записей. Если курсор устарел (пользователей
+# удалили или забанили), показывается первая страница
+async def load_users_page(status, data, per_page=USERS_PER_PAGE):
+    page_number, after_id, before_id = parse_page_cursor(data)
+    total_pages = max(1, math.ceil(await count_users_with_status(status) / per_page))
+    users = await get_users_page(status, per_page, after_id, before_id)
+    if (after_id is not None and not users) or (before_id is not None and len(users) < per_page):
+        page_number = 1
+        users = await get_users_page(status, per_page)
+    return users, max(1, min(page_number, total_pages)), total_pages
+
+# Кнопки "Назад"/"Вперёд" для страницы users: курсоры указывают на первого и последнего пользователя страницы
+def page_navigation_buttons(prefix, users, page_number, total_pages):
+    buttons = []
+    if users and page_number > 1:
+        buttons.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=f"{prefix}:page={page_number - 1}:before={users[0]['id']}"
+        ))
+    if users and page_number < total_pages:
+        buttons.append(InlineKeyboardButton(
+            text="Вперёд ➡️", callback_data=f"{prefix}:page={page_number + 1}:after={users[-1]['id']}"
+        ))
+    return buttons
+
 # Обработчик команды /start
 @router.message(CommandStart(), F.chat.type == 'private')
 async def cmd_start(message: Message):
     user_id = message.from_user.id
     if await is_user_admin(user_id):
-        anti_spam_status = "Включен" if await get_setting('anti_spam_enabled') == '1' else "Отключен"
+        chat_id = get_admin_chat(user_id)
+        anti_spam_status = "Включен" if await get_setting('anti_spam_enabled', chat_id) else "Отключен"
+        filter_mode_status = "Процессы" if await get_setting('filter_execution_mode') == MODE_PROCESS else "Встроенный"
+        # Выбор чата показывается, только если бот обслуживает несколько чатов
+        chat_buttons = []
+        if len(GROUP_IDS) > 1:
+            chat_buttons.append([InlineKeyboardButton(
+                text=f"💬 [Чат: {await describe_chat(chat_id)}] 💬", callback_data="switch_admin_chat"
+            )])
         kb = InlineKeyboardMarkup(
-            inline_keyboard=[
+            inline_keyboard=chat_buttons + [
                 [InlineKeyboardButton(text="💀 Запретки 💀", callback_data="zapret_words_kb")],
                 [InlineKeyboardButton(text="🤡 Запретные никнеймы 🤡", callback_data="zapret_nicknames_kb")],
                 [InlineKeyboardButton(text="💦 Запретные эмоджи 💦", callback_data="zapret_emoji_kb")],
@@ -63,7 +167,9 @@ async def cmd_start(message: Message):
                 [InlineKeyboardButton(text="🔇 Размут замученных 🔇", callback_data="unban_users_with_less_than_3_mutes")],
                 [InlineKeyboardButton(text="🔍 Подозрения 🔍", callback_data="suspicions_menu")],
                 [InlineKeyboardButton(text=f"⌨️ [Антиспам: {anti_spam_status}] ⌨️", callback_data="toggle_anti_spam")],
+                [InlineKeyboardButton(text=f"⚙️ [Режим фильтра: {filter_mode_status}] ⚙️", callback_data="toggle_filter_mode")],
                 [InlineKeyboardButton(text="✉️ [Изменить кол-во удаляемых сообщений] ✉️", callback_data="change_delete_count")],
+                [InlineKeyboardButton(text="🎯 [Порог нечеткого совпадения] 🎯", callback_data="change_fuzzy_threshold")],
                 [InlineKeyboardButton(text="✏️ [Редактирование 1-го поста] ✏️", callback_data="change_first_post_message")],
                 
             ]
@@ -71,6 +177,31 @@ async def cmd_start(message: Message):
         await message.answer("Добро пожаловать в админ-панель!", reply_markup=kb)
     else:
         return
+
+# Обработчик выбора чата: по кругу все чаты (общие списки и настройки) и каждый чат из GROUP_ID.
+# Списки слов и эмодзи, антиспам и остальные настройки в админ-панели относятся к выбранному чату
+@router.callback_query(lambda c: c.data == 'switch_admin_chat')
+async def switch_admin_chat(callback_query: CallbackQuery):
+    user_id = callback_query.from_user.id
+    if not await is_user_admin(user_id):
+        return
+
+    chat_ids = [GLOBAL_CHAT] + GROUP_IDS
+    current_chat = get_admin_chat(user_id)
+    chat_id = chat_ids[(chat_ids.index(current_chat) + 1) % len(chat_ids)] if current_chat in chat_ids else GLOBAL_CHAT
+    admin_chats[user_id] = chat_id
+    chat_title = await describe_chat(chat_id)
+    await callback_query.answer(f"Выбран чат: {chat_title}")
+
+    anti_spam_status = "Включен" if await get_setting('anti_spam_enabled', chat_id) else "Отключен"
+    kb = callback_query.message.reply_markup
+    for row in kb.inline_keyboard:
+        for button in row:
+            if button.callback_data == 'switch_admin_chat':
+                button.text = f"💬 [Чат: {chat_title}] 💬"
+            elif button.callback_data == 'toggle_anti_spam':
+                button.text = f"⌨️ [Антиспам: {anti_spam_status}] ⌨️"
+    await callback_query.message.edit_reply_markup(reply_markup=kb)
     
 @router.callback_query(lambda c: c.data == 'zapret_words_kb')
 async def zapret_words(callback_query: CallbackQuery):
@@ -79,7 +210,10 @@ async def zapret_words(callback_query: CallbackQuery):
             [InlineKeyboardButton(text="➕ Добавить слова ➕", callback_data="add_words")],
             [InlineKeyboardButton(text="➖ Удалить слова ➖", callback_data="remove_words")],
             [InlineKeyboardButton(text="⛔️ Показать запрещённые слова ⛔️", callback_data="show_forbidden_words")],
+            [InlineKeyboardButton(text="📤 Выгрузить в файл 📤", callback_data="export_forbidden_words")],
             [InlineKeyboardButton(text="🧹 [Очистить список слов] 🧹", callback_data="confirm_clear_words")],
+            [InlineKeyboardButton(text="📊 Статистика фильтра 📊", callback_data="show_filter_stats")],
+            [InlineKeyboardButton(text="🔥 Статистика правил 🔥", callback_data="show_rule_stats")],
             [InlineKeyboardButton(text="❌ Закрыть", callback_data="close_message")]
         ]
     )
@@ -93,6 +227,7 @@ async def zapret_nicknames(callback_query: CallbackQuery):
             [InlineKeyboardButton(text="➕ Добавить слова для никнеймов ➕", callback_data="add_nickname_words")],
             [InlineKeyboardButton(text="➖ Удалить слова для никнеймов ➖", callback_data="remove_nickname_words")],
             [InlineKeyboardButton(text="⛔️ Показать запрещённые слова в никнеймах ⛔️", callback_data="show_forbidden_nickname_words")],
+            [InlineKeyboardButton(text="📤 Выгрузить в файл 📤", callback_data="export_forbidden_nickname_words")],
             [InlineKeyboardButton(text="❌ Закрыть", callback_data="close_message")]
         ]
     )
@@ -106,6 +241,7 @@ async def zapret_emoji(callback_query: CallbackQuery):
             [InlineKeyboardButton(text="➕ Добавить эмодзи для никнеймов ➕", callback_data="add_nickname_emojis")],
             [InlineKeyboardButton(text="➖ Удалить эмодзи для никнеймов ➖", callback_data="remove_nickname_emojis")],
             [InlineKeyboardButton(text="⛔️ Показать запрещённые эмодзи в никнеймах ⛔️", callback_data="show_forbidden_nickname_emojis")],
+            [InlineKeyboardButton(text="📤 Выгрузить в файл 📤", callback_data="export_forbidden_nickname_emojis")],
             [InlineKeyboardButton(text="❌ Закрыть", callback_data="close_message")]
         ]
     )
@@ -118,13 +254,13 @@ async def toggle_anti_spam(callback_query: CallbackQuery):
     if not await is_user_admin(user_id):
         return
 
-    current_value = await get_setting('anti_spam_enabled')
-    new_value = '0' if current_value == '1' else '1'
-    await update_setting('anti_spam_enabled', new_value)
-    status = "включена" if new_value == '1' else "отключена"
+    chat_id = get_admin_chat(user_id)
+    new_value = not await get_setting('anti_spam_enabled', chat_id)
+    await update_setting('anti_spam_enabled', new_value, chat_id)
+    status = "включена" if new_value else "отключена"
     await callback_query.answer(f"Антиспамовая защита {status}.", show_alert=True)
 
-    anti_spam_status = "Включен" if new_value == '1' else "Отключен"
+    anti_spam_status = "Включен" if new_value else "Отключен"
     kb = callback_query.message.reply_markup
     for row in kb.inline_keyboard:
         for button in row:
@@ -132,6 +268,29 @@ async def toggle_anti_spam(callback_query: CallbackQuery):
                 button.text = f"Антиспам: {anti_spam_status}"
     await callback_query.message.edit_reply_markup(reply_markup=kb)
 
+# Обработчик переключения режима фильтра: в основном процессе или в пуле процессов
+@router.callback_query(lambda c: c.data == 'toggle_filter_mode')
+async def toggle_filter_mode(callback_query: CallbackQuery):
+    user_id = callback_query.from_user.id
+    if not await is_user_admin(user_id):
+        return
+
+    current_value = await get_setting('filter_execution_mode')
+    new_value = MODE_INLINE if current_value == MODE_PROCESS else MODE_PROCESS
+    await update_setting('filter_execution_mode', new_value)
+    if new_value == MODE_INLINE:
+        # Процессы больше не нужны, а каждый держит собственную копию скомпилированных правил
+        filter_pool.shutdown()
+    filter_mode_status = "Процессы" if new_value == MODE_PROCESS else "Встроенный"
+    await callback_query.answer(f"Режим фильтра: {filter_mode_status}.", show_alert=True)
+
+    kb = callback_query.message.reply_markup
+    for row in kb.inline_keyboard:
+        for button in row:
+            if button.callback_data == 'toggle_filter_mode':
+                button.text = f"⚙️ [Режим фильтра: {filter_mode_status}] ⚙️"
+    await callback_query.message.edit_reply_markup(reply_markup=kb)
+
 
 
 
@@ -141,7 +300,7 @@ async def toggle_anti_spam(callback_query: CallbackQuery):
 # Обработчик изменения сообщения для первого поста
 @router.callback_query(lambda c: c.data == 'change_first_post_message')
 async def prompt_for_new_post_message(callback_query: CallbackQuery, state: FSMContext):
-    first_message = await get_setting("first_post_message")
+    first_message = await get_setting("first_post_message", get_admin_chat(callback_query.from_user.id))
     await callback_query.message.answer(f"<b>Текст поста сейчас: \n<i>{first_message}</i></b>\n\n\nВведите новое описание для первого поста:", parse_mode=ParseMode.HTML,reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[[InlineKeyboardButton(text="❌ Отмена", callback_data="close_message_and_state")]]
             ))
@@ -151,7 +310,11 @@ async def prompt_for_new_post_message(callback_query: CallbackQuery, state: FSMC
 @router.message(FunctionStates.change_first_post_message)
 async def change_first_post_message(message: Message, state: FSMContext):
     new_message = message.text
-    await update_setting("first_post_message", new_message)
+    try:
+        await update_setting("first_post_message", new_message or '', get_admin_chat(message.from_user.id))
+    except ValueError:
+        await message.answer("Пожалуйста, введите текст сообщения.")
+        return
     await message.answer(
         f"Новое сообщение для первого поста установлено:\n\n{new_message}",
         reply_markup=InlineKeyboardMarkup(
@@ -163,7 +326,7 @@ async def change_first_post_message(message: Message, state: FSMContext):
 # Обработчик изменения числа удаляемых сообщений
 @router.callback_query(lambda c: c.data == 'change_delete_count')
 async def prompt_for_new_delete_count(callback_query: CallbackQuery, state: FSMContext):
-    counter = await get_setting("delete_message_count")
+    counter = await get_setting("delete_message_count", get_admin_chat(callback_query.from_user.id))
     await callback_query.message.answer(f"<b>Число удаляемых сообщений сейчас:\t<i>{counter}</i></b>\n\nВведите новое число сообщений для удаления:", parse_mode=ParseMode.HTML,reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[[InlineKeyboardButton(text="❌ Отмена", callback_data="close_message_and_state")]]
             ))
@@ -173,8 +336,7 @@ async def prompt_for_new_delete_count(callback_query: CallbackQuery, state: FSMC
 @router.message(FunctionStates.change_delete_message_count)
 async def change_delete_message_count(message: Message, state: FSMContext):
     try:
-        new_count = int(message.text)
-        await update_setting("delete_message_count", str(new_count))
+        new_count = await update_setting("delete_message_count", message.text or '', get_admin_chat(message.from_user.id))
         await message.answer(
             f"Новое число удаляемых сообщений установлено: {new_count}",
             reply_markup=InlineKeyboardMarkup(
@@ -185,6 +347,31 @@ async def change_delete_message_count(message: Message, state: FSMContext):
     except ValueError:
         await message.answer("Пожалуйста, введите корректное число.")
 
+# Обработчик изменения порога нечеткого совпадения запрещённых слов
+@router.callback_query(lambda c: c.data == 'change_fuzzy_threshold')
+async def prompt_for_new_fuzzy_threshold(callback_query: CallbackQuery, state: FSMContext):
+    threshold = await get_setting("fuzzy_threshold", get_admin_chat(callback_query.from_user.id))
+    await callback_query.message.answer(f"<b>Порог нечеткого совпадения сейчас:\t<i>{threshold}</i></b>\n\nВведите новый порог от 0 до 100:", parse_mode=ParseMode.HTML,reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[[InlineKeyboardButton(text="❌ Отмена", callback_data="close_message_and_state")]]
+            ))
+    await state.set_state(FunctionStates.change_fuzzy_threshold)
+    await callback_query.answer()
+
+@router.message(FunctionStates.change_fuzzy_threshold)
+async def change_fuzzy_threshold(message: Message, state: FSMContext):
+    try:
+        # Диапазон 0..100 проверяется реестром настроек
+        new_threshold = await update_setting("fuzzy_threshold", message.text or '', get_admin_chat(message.from_user.id))
+        await message.answer(
+            f"Новый порог нечеткого совпадения установлен: {new_threshold}",
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[[InlineKeyboardButton(text="❌ Закрыть", callback_data="close_message")]]
+            )
+        )
+        await state.clear()
+    except ValueError:
+        await message.answer("Пожалуйста, введите число от 0 до 100.")
+
 
 
 
@@ -0,0 +1,659 @@
+# text_filter.py
+import re
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Mapping
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
+
+# Всё, что не буква, считается "мусором", которым разбивают запрещённые слова (с.л.о.в.о, с-л-о-в-о)
+SEPARATOR_PATTERN = '[^A-Za-zА-Яа-яЁё]*'
+NON_LETTERS_RE = re.compile('[^A-Za-zА-Яа-яЁё]+')
+# Токены для нечеткого сравнения: последовательности букв и цифр
+TOKEN_RE = re.compile('[0-9A-Za-zА-Яа-яЁё]+')
+
+# Порог схожести для нечеткого сравнения по умолчанию
+DEFAULT_FUZZY_THRESHOLD = 70
+# Сколько правок (вставок, удалений, замен) допускает нечеткое правило в зависимости от длины слова:
+# (минимальная длина, правок). Короткие слова совпадают только после схлопывания повторов букв,
+# иначе обычные слова на одну букву отличаются от запрещённых ("рука", "сумка" и "сука")
+FUZZY_EDIT_BUDGETS = ((9, 2), (6, 1))
+# Повторы одной буквы (сууука, пииизда)
+REPEATS_RE = re.compile(r'(.)\1+')
+
+# Типы правил в порядке проверки: от дешёвых к дорогим
+RULE_EXACT = 'exact'
+RULE_SUBSTRING = 'substring'
+RULE_PATTERN = 'pattern'
+RULE_REGEX = 'regex'
+RULE_FUZZY = 'fuzzy'
+RULE_TYPES = (RULE_EXACT, RULE_SUBSTRING, RULE_PATTERN, RULE_REGEX, RULE_FUZZY)
+# Тип по умолчанию повторяет прежнее поведение: обфускация и нечеткое сравнение
+DEFAULT_RULE_TYPE = RULE_FUZZY
+# Префикс теневого правила: его совпадения только учитываются в статистике, сообщения не удаляются
+SHADOW_PREFIX = 'shadow:'
+
+# С какого размера матрицы "кандидаты × слова" нечеткое сравнение выполняется в нескольких потоках
+PARALLEL_FUZZY_MIN_PAIRS = 20000
+
+# Маркер конца слова в префиксном дереве
+_END = ''
+
+# Признак отсутствия записи в кэше (None — допустимое значение: "запрещённых слов нет")
+MISSING = object()
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Составные части эмодзи
+ZERO_WIDTH_JOINER = '\u200d'
+VARIATION_SELECTORS = frozenset('\ufe0e\ufe0f')
+SKIN_TONE_MODIFIERS = frozenset(map(chr, range(0x1F3FB, 0x1F400)))
+KEYCAP = '\u20e3'
+# Теги (флаги регионов вроде Шотландии) и региональные индикаторы (флаги стран)
+TAG_CHARS = frozenset(map(chr, range(0xE0020, 0xE0080)))
+REGIONAL_INDICATORS = frozenset(map(chr, range(0x1F1E6, 0x1F200)))
+
+# Транслитерация латиницы в кириллицу
+LATIN_TO_CYRILLIC = {
+    'a': 'а', 'b': 'б', 'v': 'в', 'g': 'г', 'd': 'д',
+    'e': 'е', 'z': 'з', 'i': 'и', 'k': 'к', 'l': 'л',
+    'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'r': 'р',
+    's': 'с', 't': 'т', 'u': 'у', 'f': 'ф', 'h': 'х',
+    'c': 'ц', 'y': 'у', 'w': 'ш', 'x': 'кс', 'q': 'к',
+}
+
+# Латинские буквы, похожие на кириллические по начертанию. Ими подменяют буквы внутри русских слов
+# (cука, xуй, пuзда), поэтому в словах, где смешаны латиница и кириллица, они заменяются по виду, а не по звучанию.
+# Регистр важен (B — В, b — б), поэтому замена выполняется до приведения к нижнему регистру.
+# Остальные латинские буквы таких слов и слова целиком на латинице транслитерируются по LATIN_TO_CYRILLIC
+LATIN_LOOKALIKES = {
+    'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н', 'K': 'К', 'M': 'М',
+    'O': 'О', 'P': 'Р', 'T': 'Т', 'X': 'Х', 'Y': 'У',
+    'a': 'а', 'b': 'б', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'n': 'п', 'o': 'о', 'p': 'р', 'r': 'г', 't': 'т', 'u': 'и', 'x': 'х', 'y': 'у',
+}
+LOOKALIKES_TABLE = str.maketrans(LATIN_LOOKALIKES)
+LATIN_RE = re.compile('[A-Za-z]')
+CYRILLIC_RE = re.compile('[А-Яа-яЁё]')
+# Слово из букв обоих алфавитов: начинается с букв одного алфавита, за которыми идёт буква другого
+MIXED_WORD_RE = re.compile('(?<![A-Za-zА-Яа-яЁё])(?:[A-Za-z]+[А-Яа-яЁё]|[А-Яа-яЁё]+[A-Za-z])[A-Za-zА-Яа-яЁё]*')
+
+# Цифры и символы, которыми заменяют похожие буквы
+LEET_TO_CYRILLIC = {
+    '0': 'о', '3': 'з', '4': 'ч', '6': 'б',
+    '@': 'а', '$': 'с', '€': 'е',
+}
+
+# Буквы других алфавитов, которые выглядят как кириллица
+HOMOGLYPHS_TO_CYRILLIC = {
+    # Греческий
+    'α': 'а', 'β': 'в', 'γ': 'г', 'δ': 'д', 'ε': 'е', 'η': 'н',
+    'ι': 'и', 'κ': 'к', 'λ': 'л', 'μ': 'м', 'ν': 'н', 'ο': 'о',
+    'π': 'п', 'ρ': 'р', 'σ': 'с', 'ς': 'с', 'τ': 'т', 'υ': 'у',
+    'φ': 'ф', 'χ': 'х', 'ω': 'ш',
+    # Украинский и белорусский
+    'і': 'и', 'ї': 'и', 'є': 'е', 'ґ': 'г', 'ў': 'у',
+    # Латиница с диакритикой, которая остаётся после NFKC
+    'á': 'а', 'à': 'а', 'ä': 'а', 'é': 'е', 'è': 'е', 'ë': 'е',
+    'í': 'и', 'ï': 'и', 'ó': 'о', 'ò': 'о', 'ö': 'о',
+    'ú': 'у', 'ù': 'у', 'ü': 'у', 'ý': 'у', 'ÿ': 'у', 'ç': 'ц', 'ñ': 'н',
+}
+
+# Невидимые символы, которыми разрывают слова
+ZERO_WIDTH_CHARS = '\u00ad\u180e\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff'
+
+# Таблица для str.translate собирается один раз при импорте
+NORMALIZATION_TABLE = str.maketrans({
+    **LATIN_TO_CYRILLIC,
+    **LEET_TO_CYRILLIC,
+    **HOMOGLYPHS_TO_CYRILLIC,
+    **dict.fromkeys(ZERO_WIDTH_CHARS),
+})
+
+
+# Латинские буквы в слове, где есть и кириллица, заменяются похожими кириллическими
+def _fold_lookalikes(match):
+    return match.group().translate(LOOKALIKES_TABLE)
+
+
+# Приведение текста к единому виду перед поиском запрещённых слов:
+# NFKC (стилизованные и полноширинные символы), латинские двойники в смешанных словах, нижний регистр,
+# удаление невидимых символов, замена латиницы, цифр и похожих букв на кириллицу, схлопывание пробелов
+def normalize_text(text):
+    text = unicodedata.normalize('NFKC', text)
+    # Большинство сообщений написаны одним алфавитом, для них разбор по словам не нужен
+    if LATIN_RE.search(text) and CYRILLIC_RE.search(text):
+        text = MIXED_WORD_RE.sub(_fold_lookalikes, text)
+    return WHITESPACE_RE.sub(' ', text.lower().translate(NORMALIZATION_TABLE)).strip()
+
+
+# Функция для создания регулярного выражения для одного слова
+def create_regex_pattern(word):
+    # Экранируем каждую букву и добавляем паттерн для пробелов и спецсимволов
+    escaped_letters = map(re.escape, word)
+    pattern = SEPARATOR_PATTERN.join(escaped_letters)
+    return rf'\b{pattern}\b'  # Добавляем \b для границ слова, чтобы избегать случайных совпадений
+
+
+# Отпечаток нормализованного текста для кэша вердиктов.
+# Хэшируется ровно тот текст, который проверяется: копии рейдовых сообщений, отличающиеся
+# только пробелами, дают один ключ, потому что normalize_text уже схлопнул пробелы
+def text_fingerprint(text):
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+# Ключ слова: только его буквы. По нему находим, какое слово совпало в общем выражении
+def letters_key(text):
+    return NON_LETTERS_RE.sub('', text)
+
+
+# Окна из нескольких подряд идущих токенов (для запрещённых фраз)
+def token_ngrams(tokens, max_ngram):
+    for size in range(1, min(max_ngram, len(tokens)) + 1):
+        for start in range(len(tokens) - size + 1):
+            yield ' '.join(tokens[start:start + size])
+
+
+# Кандидаты для нечеткого сравнения: весь текст, отдельные токены
+# и окна из нескольких подряд идущих токенов (для запрещённых фраз)
+def fuzzy_candidates(text, max_ngram):
+    candidates = dict.fromkeys([text])
+    candidates.update(dict.fromkeys(token_ngrams(TOKEN_RE.findall(text), max_ngram)))
+    return list(candidates)
+
+
+# Схлопывание повторов букв: растянутые слова сравниваются с правилами как обычные
+def squeeze_repeats(text):
+    return REPEATS_RE.sub(r'\1', text)
+
+
+# Сколько правок допускается при нечетком сравнении со словом такой длины
+def fuzzy_max_edits(length):
+    for min_length, edits in FUZZY_EDIT_BUDGETS:
+        if length >= min_length:
+            return edits
+    return 0
+
+
+# Разбор записи из админ-панели: необязательный префикс "тип:" и само слово.
+# Слова приводятся к нижнему регистру, регулярные выражения проверяются и сохраняются как есть
+def parse_rule_spec(entry):
+    prefix, separator, rest = entry.partition(':')
+    if separator and rest and prefix.lower() in RULE_TYPES:
+        rule_type, word = prefix.lower(), rest
+    else:
+        rule_type, word = DEFAULT_RULE_TYPE, entry
+
+    if rule_type != RULE_REGEX:
+        return word.lower(), rule_type
+    try:
+        re.compile(word)
+    except re.error as e:
+        raise ValueError(f"некорректное регулярное выражение {word!r}: {e}")
+    return word, rule_type
+
+
+# Отделяет префикс теневого правила: "shadow:exact:слово" -> ("exact:слово", True)
+def split_shadow_prefix(entry):
+    if entry[:len(SHADOW_PREFIX)].lower() == SHADOW_PREFIX and len(entry) > len(SHADOW_PREFIX):
+        return entry[len(SHADOW_PREFIX):], True
+    return entry, False
+
+
+# Обратное преобразование для показа и выгрузки списка: префикс пишется только для нестандартного типа
+def format_rule_spec(word, rule_type, shadow=False):
+    spec = word if rule_type == DEFAULT_RULE_TYPE else f'{rule_type}:{word}'
+    return SHADOW_PREFIX + spec if shadow else spec
+
+
+def _build_trie(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[_END] = True
+    return trie
+
+
+# Выражение для "хвоста" слова после уже совпавшей буквы.
+# Между буквами допускается separator (для обфускации — мусор, как и в create_regex_pattern)
+def _trie_tail_pattern(node, separator):
+    branches = [
+        re.escape(char) + _trie_tail_pattern(child, separator)
+        for char, child in sorted(node.items()) if char != _END
+    ]
+    if not branches:
+        return ''
+    tail = separator + '(?:' + '|'.join(branches) + ')'
+    if _END in node:
+        # Слово может закончиться здесь, но сначала пробуем более длинное продолжение
+        tail = '(?:' + tail + ')?'
+    return tail
+
+
+def _trie_pattern(trie, separator='', boundary=''):
+    branches = [
+        re.escape(char) + _trie_tail_pattern(child, separator)
+        for char, child in sorted(trie.items()) if char != _END
+    ]
+    return f'{boundary}(?:{"|".join(branches)}){boundary}'
+
+
+# Скомпилированный поиск по всему списку запрещённых слов.
+# Правила разных типов проверяются от дешёвых к дорогим, проверка останавливается на первом совпадении:
+#   exact     — токен (или несколько подряд идущих токенов) совпадает со словом;
+#   substring — слово встречается в тексте как подстрока;
+#   pattern   — слово с мусором между буквами (с.л.о.в.о), все слова в одном выражении по префиксному дереву;
+#   regex     — произвольное регулярное выражение;
+#   fuzzy     — как pattern, плюс нечеткое сравнение токенов со словом.
+# Слова приводятся к тому же виду, что и текст (normalize_text), а в ответ возвращается исходное слово.
+#
+# Общие выражения по префиксному дереву собираются долго, поэтому при небольших правках списка
+# (updated) они берутся из предыдущего поиска как базовые, а для новых слов собирается маленькое
+# дополнительное выражение. Удалённые слова остаются в базовом выражении и отбрасываются при проверке
+# совпадения, пока поиск не будет собран заново целиком
+class ForbiddenMatcher:
+    def __init__(self, rules, base=None):
+        if not isinstance(rules, Mapping):
+            rules = dict.fromkeys(rules, DEFAULT_RULE_TYPE)
+        self.rules = dict(rules)
+        self.words = frozenset(self.rules)
+
+        # {тип: {форма слова: исходное слово}}
+        forms = {rule_type: {} for rule_type in RULE_TYPES}
+        for word in sorted(self.rules):
+            rule_type = self.rules[word]
+            if rule_type == RULE_REGEX:
+                forms[rule_type].setdefault(word, word)
+            elif rule_type == RULE_EXACT:
+                forms[rule_type].setdefault(' '.join(TOKEN_RE.findall(normalize_text(word))), word)
+            else:
+                forms[rule_type].setdefault(normalize_text(word), word)
+        for rule_forms in forms.values():
+            # Пустая форма совпала бы с любым текстом
+            rule_forms.pop('', None)
+
+        self._exact_words = forms[RULE_EXACT]
+        self._exact_max_ngram = max((form.count(' ') + 1 for form in self._exact_words), default=1)
+
+        self._substring_words = forms[RULE_SUBSTRING]
+
+        # Нечеткие правила проверяются и как обфусцированные слова
+        self._pattern_words = {**forms[RULE_PATTERN], **forms[RULE_FUZZY]}
+        self._forms_by_key = {}
+        self._keyless_patterns = []
+        for form, word in self._pattern_words.items():
+            key = letters_key(form)
+            if key:
+                self._forms_by_key.setdefault(key, []).append(form)
+            else:
+                # Слова без букв (например, из одних цифр) нельзя опознать по ключу
+                self._keyless_patterns.append((word, re.compile(create_regex_pattern(form))))
+
+        if base is None:
+            base_substring_forms, base_substring_pattern = frozenset(self._substring_words), None
+            base_pattern_forms, base_pattern = frozenset(self._pattern_words), None
+            if base_substring_forms:
+                base_substring_pattern = re.compile(_trie_pattern(_build_trie(base_substring_forms)))
+            if base_pattern_forms:
+                base_pattern = re.compile(_trie_pattern(_build_trie(base_pattern_forms), SEPARATOR_PATTERN, r'\b'))
+        else:
+            base_substring_forms, base_substring_pattern = base._base_substring
+            base_pattern_forms, base_pattern = base._base_pattern
+        self._base_substring = (base_substring_forms, base_substring_pattern)
+        self._base_pattern = (base_pattern_forms, base_pattern)
+
+        # Слова, которых нет в базовых выражениях, и удалённые слова, которые в них остались
+        delta_substring = [form for form in self._substring_words if form not in base_substring_forms]
+        delta_pattern = [form for form in self._pattern_words if form not in base_pattern_forms]
+        stale_forms = (
+            sum(form not in self._substring_words for form in base_substring_forms)
+            + sum(form not in self._pattern_words for form in base_pattern_forms)
+        )
+        self.delta_size = len(delta_substring) + len(delta_pattern) + stale_forms
+
+        self._substring_patterns = [pattern for pattern in (
+            base_substring_pattern,
+            re.compile(_trie_pattern(_build_trie(delta_substring))) if delta_substring else None,
+        ) if pattern is not None]
+        self._patterns = [pattern for pattern in (
+            base_pattern,
+            re.compile(_trie_pattern(_build_trie(delta_pattern), SEPARATOR_PATTERN, r'\b')) if delta_pattern else None,
+        ) if pattern is not None]
+
+        self._regex_patterns = [(re.compile(form), word) for form, word in forms[RULE_REGEX].items()]
+
+        # Нечеткие правила сравниваются без повторов букв; похожими считаются только слова
+        # с той же первой буквой и не больше fuzzy_max_edits правок
+        self._fuzzy_words = {}
+        for form, word in forms[RULE_FUZZY].items():
+            self._fuzzy_words.setdefault(squeeze_repeats(form), word)
+        self._max_ngram = max((len(TOKEN_RE.findall(form)) for form in self._fuzzy_words), default=1) or 1
+        # Длинные нечеткие правила по (первая буква, длина кандидата): кандидат сравнивается только
+        # со словами на ту же букву, длина которых отличается не больше, чем на допустимое число правок
+        self._fuzzy_groups = {}
+        for form in self._fuzzy_words:
+            edits = fuzzy_max_edits(len(form))
+            for length in range(len(form) - edits, len(form) + edits + 1) if edits else ():
+                group_forms, group_edits = self._fuzzy_groups.setdefault((form[0], length), ([], []))
+                group_forms.append(form)
+                group_edits.append(edits)
+
+    # Поиск собран целиком, без дополнительных выражений и удалённых слов
+    @property
+    def is_compact(self):
+        return self.delta_size == 0
+
+    # Новый поиск по изменённому списку, который переиспользует базовые выражения этого поиска.
+    # Если правок накопилось больше max_delta, возвращает None: дешевле собрать поиск заново
+    def updated(self, rules, max_delta=None):
+        matcher = ForbiddenMatcher(rules, base=self)
+        if max_delta is not None and matcher.delta_size > max_delta:
+            return None
+        return matcher
+
+    def _search_exact(self, text):
+        if not self._exact_words:
+            return None
+        for candidate in token_ngrams(TOKEN_RE.findall(text), self._exact_max_ngram):
+            word = self._exact_words.get(candidate)
+            if word is not None:
+                return word
+        return None
+
+    def _search_substring(self, text):
+        for pattern in self._substring_patterns:
+            position = 0
+            while True:
+                match = pattern.search(text, position)
+                if match is None:
+                    break
+                word = self._substring_words.get(match.group())
+                if word is not None:
+                    return word
+                # Совпало удалённое слово: с того же места может начинаться более короткое действующее
+                start = match.start()
+                for end in range(match.end() - 1, start, -1):
+                    word = self._substring_words.get(text[start:end])
+                    if word is not None:
+                        return word
+                position = start + 1
+        return None
+
+    def _search_pattern(self, text):
+        for pattern in self._patterns:
+            position = 0
+            while True:
+                match = pattern.search(text, position)
+                if match is None:
+                    break
+                key = letters_key(match.group())
+                forms = self._forms_by_key.get(key)
+                if forms:
+                    return self._pattern_words[forms[0]]
+                # Совпало удалённое слово: проверяем действующие слова, которые являются его началом
+                start = match.start()
+                for length in range(len(key) - 1, 0, -1):
+                    for form in self._forms_by_key.get(key[:length], ()):
+                        if re.compile(create_regex_pattern(form)).match(text, start):
+                            return self._pattern_words[form]
+                position = start + 1
+        for word, pattern in self._keyless_patterns:
+            if pattern.search(text):
+                return word
+        return None
+
+    # Регулярные выражения проверяются по одному, поэтому время каждого можно замерить отдельно
+    def _search_regex(self, text, profile=None):
+        for pattern, word in self._regex_patterns:
+            if profile is None:
+                found = pattern.search(text)
+            else:
+                started = time.perf_counter()
+                found = pattern.search(text)
+                profile.rules[word] = time.perf_counter() - started
+            if found:
+                return word
+        return None
+
+    # Возвращает запрещённое слово, найденное в нормализованном тексте всеми правилами, кроме нечетких, или None.
+    # Если передан profile, в него записывается время каждого уровня правил
+    def search(self, text, profile=None):
+        for rule_type, tier in (
+            (RULE_EXACT, self._search_exact),
+            (RULE_SUBSTRING, self._search_substring),
+            (RULE_PATTERN, self._search_pattern),
+            (RULE_REGEX, self._search_regex),
+        ):
+            if profile is None:
+                word = tier(text)
+            else:
+                started = time.perf_counter()
+                word = self._search_regex(text, profile) if rule_type == RULE_REGEX else tier(text)
+                profile.tiers[rule_type] = time.perf_counter() - started
+            if word is not None:
+                return word
+        return None
+
+    # Нечеткий поиск: сначала кандидаты без повторов букв ищутся среди правил точно, затем
+    # каждый кандидат сравнивается пакетным вызовом rapidfuzz только со своей группой длинных правил
+    # (та же первая буква, близкая длина), поэтому стоимость почти не зависит от размера списка.
+    # Пары, набравшие порог, дополнительно проверяются на число правок,
+    # чтобы обычные слова, похожие на запрещённые одной-двумя буквами, не удалялись
+    def fuzzy_search(self, text, threshold=DEFAULT_FUZZY_THRESHOLD):
+        if not self._fuzzy_words:
+            return None
+        groups = {}
+        for candidate in dict.fromkeys(map(squeeze_repeats, fuzzy_candidates(text, self._max_ngram))):
+            word = self._fuzzy_words.get(candidate)
+            if word is not None:
+                return word
+            key = (candidate[:1], len(candidate))
+            if key in self._fuzzy_groups:
+                groups.setdefault(key, []).append(candidate)
+
+        best_score, best_word = 0, None
+        for key, candidates in groups.items():
+            forms, form_edits = self._fuzzy_groups[key]
+            # Для маленьких матриц запуск потоков дороже самого сравнения
+            workers = -1 if len(candidates) * len(forms) >= PARALLEL_FUZZY_MIN_PAIRS else 1
+            scores = process.cdist(candidates, forms, scorer=fuzz.ratio, score_cutoff=threshold, workers=workers)
+            for row, column in zip(*scores.nonzero()):
+                if scores[row, column] <= best_score:
+                    continue
+                edits = form_edits[column]
+                if Levenshtein.distance(candidates[row], forms[column], score_cutoff=edits) <= edits:
+                    best_score, best_word = scores[row, column], self._fuzzy_words[forms[column]]
+        return best_word
+
+    # Полная проверка нормализованного текста: сначала дешёвые правила, затем нечеткое сравнение
+    def scan(self, text, threshold=DEFAULT_FUZZY_THRESHOLD, profile=None):
+        word = self.search(text, profile)
+        if word is None:
+            if profile is None:
+                word = self.fuzzy_search(text, threshold)
+            else:
+                started = time.perf_counter()
+                word = self.fuzzy_search(text, threshold)
+                profile.tiers[RULE_FUZZY] = time.perf_counter() - started
+        return word
+
+
+# Замеры одной проверки текста, секунды: время каждого уровня правил и каждого регулярного выражения.
+# Правила из общих выражений проверяются вместе, поэтому их стоимость видна только для уровня целиком
+class ScanProfile:
+    def __init__(self):
+        self.tiers = {}
+        self.rules = {}
+
+
+# Счётчики срабатываний и стоимости правил. Копятся в памяти и периодически забираются (drain) для записи в базу
+class RuleStats:
+    def __init__(self):
+        # {слово: [срабатывания, теневые срабатывания, суммарное время]}
+        self._rules = {}
+        # {уровень: [проверки, суммарное время]}
+        self._tiers = {}
+
+    def _rule(self, word):
+        counters = self._rules.get(word)
+        if counters is None:
+            counters = self._rules[word] = [0, 0, 0.0]
+        return counters
+
+    def record_scan(self, profile):
+        for tier, elapsed in profile.tiers.items():
+            counters = self._tiers.get(tier)
+            if counters is None:
+                counters = self._tiers[tier] = [0, 0.0]
+            counters[0] += 1
+            counters[1] += elapsed
+        for word, elapsed in profile.rules.items():
+            self._rule(word)[2] += elapsed
+
+    def record_hit(self, word, shadow=False):
+        self._rule(word)[1 if shadow else 0] += 1
+
+    # Возвращает накопленные счётчики и начинает копить заново
+    def drain(self):
+        rules, tiers = self._rules, self._tiers
+        self._rules, self._tiers = {}, {}
+        return rules, tiers
+
+
+# Разбивает текст на графемы: эмодзи с модификаторами цвета кожи, селекторами вариантов,
+# ZWJ-последовательности (👨‍👩‍👧), флаги и keycap-последовательности остаются одним элементом
+def iter_graphemes(text):
+    position = 0
+    length = len(text)
+    while position < length:
+        start = position
+        position += 1
+        if text[start] in REGIONAL_INDICATORS and position < length and text[position] in REGIONAL_INDICATORS:
+            # Флаг страны — пара региональных индикаторов
+            position += 1
+        else:
+            while position < length:
+                char = text[position]
+                if (char in VARIATION_SELECTORS or char in SKIN_TONE_MODIFIERS or char in TAG_CHARS
+                        or char == KEYCAP or unicodedata.combining(char)):
+                    position += 1
+                elif char == ZERO_WIDTH_JOINER and position + 1 < length:
+                    # ZWJ присоединяет следующий символ к текущей графеме
+                    position += 2
+                else:
+                    break
+        yield text[start:position]
+
+
+# Ключ графемы без селекторов вариантов: ❤ и ❤️ считаются одним эмодзи
+def _emoji_key(grapheme):
+    return ''.join(char for char in grapheme if char not in VARIATION_SELECTORS)
+
+
+def _without_skin_tone(key):
+    return ''.join(char for char in key if char not in SKIN_TONE_MODIFIERS)
+
+
+# Графема никнейма совпадает с графемой записи как есть или без цвета кожи
+def _grapheme_matches(key, entry_key):
+    return key == entry_key or _without_skin_tone(key) == entry_key
+
+
+# Индекс запрещённых эмодзи: никнейм разбивается на графемы один раз, а записи ищутся
+# по хэшу своей первой графемы, поэтому время почти не зависит от размера списка.
+# Запись из нескольких графем ("🍑💦", "18+") совпадает только целиком, подряд идущими графемами.
+# Запрещённый эмодзи без цвета кожи находит и его варианты с цветом кожи,
+# но отдельный эмодзи не находится внутри составной ZWJ-последовательности
+class EmojiIndex:
+    def __init__(self, emojis):
+        self.emojis = frozenset(emojis)
+        # {ключ первой графемы: [ключи всех графем записи]}
+        self._sequences = {}
+        for emoji in self.emojis:
+            keys = tuple(_emoji_key(grapheme) for grapheme in iter_graphemes(emoji))
+            if keys:
+                self._sequences.setdefault(keys[0], []).append(keys)
+
+    def __bool__(self):
+        return bool(self._sequences)
+
+    def contains_any(self, text):
+        if not self._sequences:
+            return False
+        keys = [_emoji_key(grapheme) for grapheme in iter_graphemes(text)]
+        for position, key in enumerate(keys):
+            for first_key in {key, _without_skin_tone(key)}:
+                for sequence in self._sequences.get(first_key, ()):
+                    if len(sequence) <= len(keys) - position and all(
+                        _grapheme_matches(keys[position + offset], entry_key)
+                        for offset, entry_key in enumerate(sequence[1:], 1)
+                    ):
+                        return True
+        return False
+
+
+# Проверка никнейма: 'violator' — есть и запрещённое слово, и запрещённый эмодзи,
+# 'suspicious' — только запрещённое слово, None — никнейм в порядке
+def check_nickname(full_name, emoji_index, forbidden_words):
+    lower_full_name = full_name.lower()
+    # Проверка на запрещённые слова
+    if not any(word in lower_full_name for word in forbidden_words):
+        return None
+    # Проверка на запрещённые эмодзи
+    if emoji_index.contains_any(full_name):
+        return 'violator'
+    return 'suspicious'
+
+
+# Ограниченный кэш: вытесняет давно не использованные записи и забывает записи старше ttl секунд
+class LRUCache:
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        item = self._data.get(key, MISSING)
+        if item is MISSING:
+            self.misses += 1
+            return default
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -1,23 +1,33 @@
 
 
-import re
+import html
+import asyncio
 import logging
 from aiogram import F, Router
 from aiogram.types import (
     Message, ContentType, CallbackQuery, InlineKeyboardButton,
     InlineKeyboardMarkup
 )
-from show_handlers import is_user_admin, FunctionStates
+from show_handlers import (
+    is_user_admin, get_admin_chat, FunctionStates, read_list_entries, describe_list_entries, make_list_document
+)
+from filter_pool import filter_pool, MODE_PROCESS
+from text_filter import (
+    MISSING, LRUCache, normalize_text, text_fingerprint,
+    check_nickname, parse_rule_spec, format_rule_spec, split_shadow_prefix,
+    ScanProfile, RuleStats, RULE_TYPES
+)
 from aiogram.fsm.context import FSMContext
 from collections import defaultdict
-from rapidfuzz import fuzz
 
-from config.config_bot import bot, GROUP_ID, ADMINS, CHANNEL_ID
+from config.config_bot import bot, GROUP_IDS, ADMINS, CHANNEL_IDS
 from database import (
-    get_forbidden_words, add_forbidden_word, remove_forbidden_word,
-    clear_forbidden_words, get_setting,
+    get_forbidden_rules, get_shadow_words, add_forbidden_rules_bulk, remove_forbidden_words_bulk,
+    clear_forbidden_words, get_settings,
     get_user, get_user, add_or_update_user,
-    get_forbidden_nickname_emojis, get_forbidden_nickname_words
+    get_list_snapshot,
+    get_forbidden_matcher, get_chat_forbidden_matcher, get_nickname_lists_version, get_nickname_emoji_index,
+    get_shadow_matcher, save_rule_stats, get_top_rules, get_filter_tier_stats, user_cache
 )
 
 router = Router()
@@ -45,7 +55,7 @@ async def clear_words(callback_query: CallbackQuery):
     if not await is_user_admin(user_id):
         return
 
-    await clear_forbidden_words()
+    await clear_forbidden_words(get_admin_chat(user_id))
     await callback_query.answer("Все запрещённые слова успешно удалены.")
     await callback_query.message.delete()
 
@@ -63,9 +73,14 @@ async def process_show_forbidden_words(callback_query: CallbackQuery):
 
         return
 
-    forbidden_words = await get_forbidden_words()
-    if forbidden_words:
-        words_list = ', '.join(sorted(forbidden_words))
+    chat_id = get_admin_chat(user_id)
+    forbidden_rules = await get_forbidden_rules(chat_id)
+    shadow_words = await get_shadow_words(chat_id)
+    if forbidden_rules:
+        words_list = html.escape(', '.join(
+            format_rule_spec(word, rule_type, word in shadow_words)
+            for word, rule_type in sorted(forbidden_rules.items())
+        ))
         message_text = f"🚫Запрещённые слова:\n{words_list}"
     else:
         message_text = "Список запрещённых слов пуст"
@@ -78,6 +93,25 @@ async def process_show_forbidden_words(callback_query: CallbackQuery):
     await callback_query.message.answer(message_text, parse_mode='HTML', reply_markup=kb)
     await callback_query.answer()
 
+# Обработчик нажатия кнопки "Выгрузить в файл"
+@router.callback_query(lambda c: c.data == 'export_forbidden_words')
+async def export_forbidden_words(callback_query: CallbackQuery):
+    user_id = callback_query.from_user.id
+    if not await is_user_admin(user_id):
+        return
+
+    chat_id = get_admin_chat(user_id)
+    forbidden_rules = await get_forbidden_rules(chat_id)
+    shadow_words = await get_shadow_words(chat_id)
+    await callback_query.message.answer_document(
+        make_list_document(
+            [format_rule_spec(word, rule_type, word in shadow_words) for word, rule_type in forbidden_rules.items()],
+            'forbidden_words.txt'
+        ),
+        caption=f"Запрещённых слов: {len(forbidden_rules)}"
+    )
+    await callback_query.answer()
+
 # Обработчик нажатия кнопки "Добавить слова"
 @router.callback_query(lambda c: c.data == "add_words")
 async def process_add_words(callback_query: CallbackQuery, state: FSMContext):
@@ -88,7 +122,19 @@ async def process_add_words(callback_query: CallbackQuery, state: FSMContext):
     await callback_query.message.answer(
         "Пожалуйста, введите слова для <b>добавления</b>. "
         "Вы можете вводить несколько слов через пробел или фразы в кавычках.\n"
-        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>",
+        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>\n"
+        "Можно отправить файл .txt (по слову или фразе в строке) или .csv.\n\n"
+        "Тип правила задаётся префиксом, без префикса слово ищется и с опечатками (<code>fuzzy:</code>):\n"
+        "<code>exact:</code> — только целое слово или фраза;\n"
+        "<code>substring:</code> — подстрока в любом месте текста;\n"
+        "<code>pattern:</code> — слово, в том числе разбитое символами (с.л.о.в.о);\n"
+        "<code>regex:</code> — регулярное выражение, пишите его в одинарных кавычках: "
+        "<code>'regex:кл[ао]д\\w*'</code>. Выражение применяется к тексту после нормализации "
+        "(нижний регистр, латиница и цифры заменены на похожие русские буквы).\n"
+        "Повторное добавление слова с другим префиксом меняет тип правила.\n"
+        "Префикс <code>shadow:</code> перед остальными (<code>shadow:exact:слово</code>) добавляет правило "
+        "в теневом режиме: совпадения попадают в статистику правил, но сообщения не удаляются. "
+        "Чтобы включить такое правило, добавьте слово ещё раз без <code>shadow:</code>.",
         parse_mode='HTML'
     )
     await state.set_state(FunctionStates.waiting_for_words_to_add)
@@ -104,7 +150,9 @@ async def process_remove_words(callback_query: CallbackQuery, state: FSMContext)
     await callback_query.message.answer(
         "Пожалуйста, введите слова для <b>удаления</b>. "
         "Вы можете вводить несколько слов через пробел или фразы в кавычках.\n"
-        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>",
+        "Пример: <code>слово1 слово2 \"фраза для бана\"</code>\n"
+        "Можно отправить файл .txt (по слову или фразе в строке) или .csv. "
+        "Префикс типа правила при удалении можно не указывать.",
         parse_mode='HTML'
     )
     await state.set_state(FunctionStates.waiting_for_words_to_remove)
@@ -117,23 +165,23 @@ async def add_words_handler(message: Message, state: FSMContext):
     if not await is_user_admin(user_id):
         return
 
-    text = message.text
-
-    import shlex
     try:
-        words_to_add = shlex.split(text)
+        entries = [split_shadow_prefix(entry) for entry in await read_list_entries(message)]
+        rules_to_add = [parse_rule_spec(entry) for entry, shadow in entries if not shadow]
+        shadow_rules_to_add = [parse_rule_spec(entry) for entry, shadow in entries if shadow]
     except ValueError as e:
         await message.answer(f"Ошибка при обработке введённых данных: {e}")
         return
 
-    added_words = []
-    for word in words_to_add:
-        await add_forbidden_word(word)
-        added_words.append(word.lower())
+    # Все слова записываются одной транзакцией (теневые — отдельной)
+    chat_id = get_admin_chat(user_id)
+    added_words = await add_forbidden_rules_bulk(rules_to_add, chat_id=chat_id)
+    added_words += await add_forbidden_rules_bulk(shadow_rules_to_add, shadow=True, chat_id=chat_id)
 
     if added_words:
         await message.answer(
-            f"Слова/фразы <b>{', '.join(added_words)}</b> добавлены в список запрещённых слов.",
+            f"Слова/фразы <b>{describe_list_entries(added_words)}</b> добавлены в список запрещённых слов "
+            f"(всего добавлено: {len(added_words)}).",
             parse_mode='HTML'
         )
     else:
@@ -148,23 +196,20 @@ async def remove_words_handler(message: Message, state: FSMContext):
     if not await is_user_admin(user_id):
         return
 
-    text = message.text
-
-    import shlex
     try:
-        words_to_remove = shlex.split(text)
+        words_to_remove = [
+            parse_rule_spec(split_shadow_prefix(entry)[0])[0] for entry in await read_list_entries(message)
+        ]
     except ValueError as e:
         await message.answer(f"Ошибка при обработке введённых данных: {e}")
         return
 
-    removed_words = []
-    for word in words_to_remove:
-        await remove_forbidden_word(word)
-        removed_words.append(word.lower())
+    removed_words = await remove_forbidden_words_bulk(words_to_remove, get_admin_chat(user_id))
 
     if removed_words:
         await message.answer(
-            f"Слова/фразы <b>{', '.join(removed_words)}</b> удалены из списка запрещённых слов.",
+            f"Слова/фразы <b>{describe_list_entries(removed_words)}</b> удалены из списка запрещённых слов "
+            f"(всего удалено: {len(removed_words)}).",
             parse_mode='HTML'
         )
     else:
@@ -174,27 +219,6 @@ async def remove_words_handler(message: Message, state: FSMContext):
 
 
 
-# Функция для создания регулярного выражения
-def create_regex_pattern(word):
-    # Экранируем каждую букву и добавляем паттерн для пробелов и спецсимволов
-    escaped_letters = map(re.escape, word)
-    pattern = '[^A-Za-zА-Яа-яЁё]*'.join(escaped_letters)
-    return rf'\b{pattern}\b'  # Добавляем \b для границ слова, чтобы избегать случайных совпадений
-
-def transliterate_to_cyrillic(text):
-    translit_map = {
-        'a': 'а', 'b': 'б', 'v': 'в', 'g': 'г', 'd': 'д',
-        'e': 'е', 'z': 'з', 'i': 'и', 'k': 'к', 'l': 'л',
-        'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'r': 'р',
-        's': 'с', 't': 'т', 'u': 'у', 'f': 'ф', 'h': 'х',
-        'c': 'ц', 'y': 'у', 'w': 'ш', 'x': 'кс', 'q': 'к',
-
-    }
-    result = ''
-    for char in text:
-        result += translit_map.get(char, char)
-    return result
-
 last_command_time = None
 rules = """, вот <b>правила чата:</b>
 \n1. Нельзя писать команды <i>(через /)</i>
@@ -204,8 +228,109 @@ rules = """, вот <b>правила чата:</b>
 # Глобальный словарь для отслеживания количества удалённых сообщений в каждой теме обсуждения
 message_counts = defaultdict(dict)
 
+# Кэш вердиктов по уже проверенным текстам:
+# {(версия общего списка, версия списка чата, порог, отпечаток текста): (слово или None, теневое слово или None)}
+verdict_cache = LRUCache(max_size=10000, ttl=600)
+
+# Кэш проверок никнеймов: {(chat_id, user_id): (версия списков чата, хэш имени, вердикт)}
+nickname_cache = LRUCache(max_size=50000)
+
+# Срабатывания и стоимость правил копятся в памяти и раз в RULE_STATS_FLUSH_INTERVAL секунд пишутся в базу
+rule_stats = RuleStats()
+RULE_STATS_FLUSH_INTERVAL = 60
+# Сколько правил показывать в статистике правил
+RULE_STATS_TOP = 10
+
+async def flush_rule_stats():
+    rules_counters, tiers_counters = rule_stats.drain()
+    if rules_counters or tiers_counters:
+        await save_rule_stats(rules_counters, tiers_counters)
+
+async def flush_rule_stats_periodically():
+    while True:
+        await asyncio.sleep(RULE_STATS_FLUSH_INTERVAL)
+        try:
+            await flush_rule_stats()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении статистики правил: {e}")
+
+# Обработчик кнопки "Статистика фильтра"
+@router.callback_query(lambda c: c.data == 'show_filter_stats')
+async def show_filter_stats(callback_query: CallbackQuery):
+    user_id = callback_query.from_user.id
+    if not await is_user_admin(user_id):
+        return
+
+    message_text = ''
+    caches = (
+        ("Кэш вердиктов фильтра", verdict_cache),
+        ("Кэш проверок никнеймов", nickname_cache),
+        ("Кэш пользователей", user_cache),
+    )
+    for title, cache in caches:
+        stats = cache.stats()
+        message_text += (
+            f"📊 <b>{title}</b>\n"
+            f"Записей: {stats['size']} из {stats['max_size']}\n"
+            f"Попадания: {stats['hits']}\n"
+            f"Промахи: {stats['misses']}\n"
+            f"Доля попаданий: {stats['hit_rate']:.1%}\n\n"
+        )
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Закрыть", callback_data="close_message")]
+        ]
+    )
+    await callback_query.message.answer(message_text, parse_mode='HTML', reply_markup=kb)
+    await callback_query.answer()
+
+# Обработчик кнопки "Статистика правил": самые частые и самые дорогие правила
+@router.callback_query(lambda c: c.data == 'show_rule_stats')
+async def show_rule_stats(callback_query: CallbackQuery):
+    user_id = callback_query.from_user.id
+    if not await is_user_admin(user_id):
+        return
+
+    await flush_rule_stats()
+    hot_rules = await get_top_rules('hits', RULE_STATS_TOP)
+    costly_rules = await get_top_rules('total_time', RULE_STATS_TOP)
+    tier_stats = await get_filter_tier_stats()
+
+    message_text = "🔥 <b>Чаще всего срабатывают:</b>\n"
+    for number, rule in enumerate(hot_rules, 1):
+        spec = html.escape(format_rule_spec(rule['word'], rule['rule_type'], rule['shadow']))
+        message_text += f"{number}. {spec} — {rule['hits']}"
+        if rule['shadow_hits']:
+            message_text += f" (в тени: {rule['shadow_hits']})"
+        message_text += "\n"
+    if not hot_rules:
+        message_text += "Срабатываний пока нет.\n"
+
+    # Правила из общих выражений проверяются вместе, отдельно замеряются только регулярные выражения
+    message_text += "\n⏱ <b>Самые дорогие регулярные выражения:</b>\n"
+    for number, rule in enumerate(costly_rules, 1):
+        spec = html.escape(format_rule_spec(rule['word'], rule['rule_type'], rule['shadow']))
+        message_text += f"{number}. {spec} — {rule['total_time'] * 1000:.1f} мс всего\n"
+    if not costly_rules:
+        message_text += "Замеров пока нет.\n"
+
+    message_text += "\n📊 <b>Уровни фильтра (среднее время проверки):</b>\n"
+    for tier in RULE_TYPES:
+        stats = tier_stats.get(tier)
+        if stats and stats['evaluations']:
+            average = stats['total_time'] / stats['evaluations'] * 1e6
+            message_text += f"{tier} — {average:.1f} мкс, проверок: {stats['evaluations']}\n"
+
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Закрыть", callback_data="close_message")]
+        ]
+    )
+    await callback_query.message.answer(message_text, parse_mode='HTML', reply_markup=kb)
+    await callback_query.answer()
+
 # Обработчик сообщений в группе
-@router.message(F.chat.id == GROUP_ID)
+@router.message(F.chat.id.in_(GROUP_IDS))
 async def handle_group_message(message: Message):
     text = message.text or message.caption
     chat_id = message.chat.id
@@ -217,10 +342,10 @@ async def handle_group_message(message: Message):
     if chat_id not in message_counts:
         message_counts[chat_id] = {}
 
-    delete_message_count = int(await get_setting("delete_message_count") or 5)
-    first_post_message = await get_setting("first_post_message") or (
-        "Я слежу чтобы вы не писали гадости, кто ослушается: будет наказан👇🏻👇🏻👇🏻"
-    )
+    settings = get_settings(chat_id)
+    delete_message_count = settings["delete_message_count"]
+    fuzzy_threshold = settings["fuzzy_threshold"]
+    first_post_message = settings["first_post_message"]
 
     if (message.from_user and message.from_user.id == bot.id) or str(user_id) in ADMINS:
         return
@@ -242,34 +367,37 @@ async def handle_group_message(message: Message):
         return
 
     # Проверяем, есть ли у пользователя статус
-    user_data = await get_user(user_id)
+    user_data = await get_user(user_id, chat_id)
 
     if user_data and user_data['status'] in ['suspicious', 'violator']:
         # Пользователь уже помечен, не нужно повторно проверять
         pass
     else:
         full_name = message.from_user.full_name or ''
-        lower_full_name = full_name.lower()
-        forbidden_emojis = await get_forbidden_nickname_emojis()
-        forbidden_words_nickname = await get_forbidden_nickname_words()
 
-        # Проверка на запрещённые эмодзи
-        has_forbidden_emoji = any(emoji in full_name for emoji in forbidden_emojis)
-        # Проверка на запрещённые слова
-        has_forbidden_word_nickname = any(word in lower_full_name for word in forbidden_words_nickname)
-
-        if has_forbidden_emoji and has_forbidden_word_nickname:
+        # Никнеймы почти не меняются: повторно проверяем только при смене имени или списков
+        nickname_version = get_nickname_lists_version(chat_id)
+        name_hash = hash(full_name)
+        cached = nickname_cache.get((chat_id, user_id))
+        if cached is not MISSING and cached[0] == nickname_version and cached[1] == name_hash:
+            nickname_status = cached[2]
+        else:
+            forbidden_words_nickname = get_list_snapshot('forbidden_nickname_words', chat_id)[1]
+            nickname_status = check_nickname(full_name, get_nickname_emoji_index(chat_id), forbidden_words_nickname)
+            nickname_cache.set((chat_id, user_id), (nickname_version, name_hash, nickname_status))
+
+        if nickname_status == 'violator':
             # Пользователь является нарушителем
             await add_or_update_user(user_id, message.chat.id, mute_count=0, last_mute_time=None, status='violator')
             logger.info(f"Пользователь {user_id} помечен как нарушитель")
             await message.delete()
-        elif has_forbidden_word_nickname:
+        elif nickname_status == 'suspicious':
             # Пользователь является подозрительным
             await add_or_update_user(user_id, message.chat.id, mute_count=0, last_mute_time=None, status='suspicious')
             logger.info(f"Пользователь {user_id} помечен как подозрительный")
             await message.delete()
     
-    if message.sender_chat and message.sender_chat.id == CHANNEL_ID and not thread_id:
+    if message.sender_chat and message.sender_chat.id in CHANNEL_IDS and not thread_id:
         try:
             await message.reply(first_post_message)
             logger.info(f"Отправлено первое сообщение в ответ на пост ID: {message_id} в чате ID: {chat_id}")
@@ -294,8 +422,10 @@ async def handle_group_message(message: Message):
 
     # Проверка на запрещённые слова
     if text:
-        forbidden_words = await get_forbidden_words()
-        
+        # Общие слова (их может проверять пул процессов) и собственные слова чата
+        version, matcher = get_forbidden_matcher()
+        chat_version, chat_matcher = get_chat_forbidden_matcher(chat_id)
+
         # Проверка на превышение длины сообщения
         if len(text) > 300:
             try:
@@ -304,20 +434,44 @@ async def handle_group_message(message: Message):
                 logger.error(f"Ошибка при удалении длинного сообщения: {e}")
             return
 
-        lower_text = transliterate_to_cyrillic(text.lower())
-
-        threshold = 70  # Порог схожести для нечеткого сравнения
-
-        for word in forbidden_words:
-            pattern = create_regex_pattern(word)
-            similarity = fuzz.ratio(lower_text, word.lower())
-
-            # Удаление сообщения, если обнаружено совпадение с запрещенным словом
-            if re.search(pattern, lower_text) or similarity >= threshold:
-                try:
-                    await message.delete()
-                    logger.info(f"Удалено сообщение {message.message_id} с запрещённым словом '{word}'")
-                except Exception as e:
-                    logger.error(f"Ошибка при удалении сообщения {message.message_id}: {e}")
-                break  # Останавливаем проверку, если сообщение уже удалено
+        lower_text = normalize_text(text)
+
+        # Повторяющиеся тексты (рейды, флуд) проверяются один раз для каждой версии списка слов
+        verdict_key = (version, chat_version, fuzzy_threshold, text_fingerprint(lower_text))
+        verdict = verdict_cache.get(verdict_key)
+        if verdict is MISSING:
+            # Все слова проверяются одним скомпилированным выражением за один проход по тексту,
+            # затем токены сообщения нечетко сравниваются со списком одним пакетным вызовом
+            if settings["filter_execution_mode"] == MODE_PROCESS:
+                matched_word, profile = await filter_pool.scan(version, matcher, lower_text, fuzzy_threshold)
+            else:
+                profile = ScanProfile()
+                matched_word = matcher.scan(lower_text, fuzzy_threshold, profile)
+            # Слов отдельного чата немного, они проверяются в основном процессе
+            if matched_word is None and chat_matcher is not None:
+                matched_word = chat_matcher.scan(lower_text, fuzzy_threshold, profile)
+            rule_stats.record_scan(profile)
+
+            # Теневые правила только учитываются в статистике
+            shadow_word = None
+            for shadow_matcher in (get_shadow_matcher(), get_shadow_matcher(chat_id)):
+                if shadow_word is None and shadow_matcher is not None:
+                    shadow_word = shadow_matcher.scan(lower_text, fuzzy_threshold)
+            verdict = (matched_word, shadow_word)
+            verdict_cache.set(verdict_key, verdict)
+        matched_word, shadow_word = verdict
+
+        if shadow_word is not None:
+            rule_stats.record_hit(shadow_word, shadow=True)
+            logger.info(f"Теневое правило '{shadow_word}' сработало на сообщении {message.message_id}")
+        if matched_word is not None:
+            rule_stats.record_hit(matched_word)
+
+        # Удаление сообщения, если обнаружено совпадение с запрещенным словом
+        if matched_word is not None:
+            try:
+                await message.delete()
+                logger.info(f"Удалено сообщение {message.message_id} с запрещённым словом '{matched_word}'")
+            except Exception as e:
+                logger.error(f"Ошибка при удалении сообщения {message.message_id}: {e}")
     
\ No newline at end of file